@@ -0,0 +1,267 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+"""
+    Benchmark suite of the signal, reader and export hot paths on synthetic shaking table records
+Every case is timed on a grid of record sizes (samples × channels) and the results are stored as json:
+    python my_benchmark.py --output bench.json
+    python my_benchmark.py --output new.json --baseline bench.json --threshold 0.2
+The second call exits with 1 when a case is slower than the baseline by more than the threshold, so a performance
+change can be measured against the commit before it. --quick runs the smallest sizes, --full adds 1e7 samples and
+128 channels (several GB of memory).
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from my_channels import ChannelSet
+from my_output import Export2D, ExportArray
+from my_rpt import csv_reader, rpt_reader
+from my_signal import Motion, my_butter_lowpass_filter, my_dft, my_hanning
+
+
+FS = 200.
+SIZES = [(10 ** 4, 1), (10 ** 4, 8), (10 ** 5, 1), (10 ** 5, 8), (10 ** 5, 32), (10 ** 6, 8), (10 ** 6, 32)]
+QUICK_SIZES = [(10 ** 4, 1), (10 ** 4, 8)]
+FULL_SIZES = SIZES + [(10 ** 6, 128), (10 ** 7, 8), (10 ** 7, 32), (10 ** 7, 128)]
+
+
+def synthetic_motion(n_samples, n_channels, fs=FS, seed=0, dtype=float):
+    """
+        white noise through floor-like resonances plus drift, a stand-in for shaking table accelerations
+    :return: time (samples,), motion (samples, channels)
+    """
+    rng = np.random.default_rng(seed)
+    time_array = np.arange(n_samples) / fs
+    frequency = np.linspace(1., 20., n_channels)
+    motion = rng.standard_normal((n_samples, n_channels)).astype(dtype)
+    motion += np.sin(2 * np.pi * np.outer(time_array, frequency)).astype(dtype)
+    motion += (1e-3 * time_array).astype(dtype)[:, None]
+    return time_array, motion
+
+
+def write_rpt(path, time_array, motion):
+    """
+        Abaqus-like .rpt report: a blank line, a title line, the column names and whitespace separated values
+    """
+    names = ['X'] + [f'ACC{i}' for i in range(motion.shape[1])]
+    with open(path, 'w') as f:
+        f.write('\n REPORT\n' + ' '.join(f'{name:>16}' for name in names) + '\n')
+        np.savetxt(f, np.column_stack([time_array, motion]), fmt='%16.8E', delimiter=' ')
+
+
+def write_csv(path, time_array, motion):
+    names = ['time'] + [f'ACC{i}' for i in range(motion.shape[1])]
+    with open(path, 'w') as f:
+        f.write(','.join(names) + '\n')
+        np.savetxt(f, np.column_stack([time_array, motion]), fmt='%.8e', delimiter=',')
+
+
+# every case maps (time, motion, workdir) to the callable that is timed, the set up is not timed
+def _case_dft(time_array, motion, workdir):
+    return lambda: my_dft(time_array, motion)
+
+
+def _case_motion_dft(time_array, motion, workdir):
+    # without the spectrum cache every call computes the FFT, a cached Motion would only time the lookup
+    record = Motion(time_array, motion, cache_bytes=0)
+    return lambda: record.dft(quantities=('frequency', 'amplitude'))
+
+
+def _case_hanning(time_array, motion, workdir):
+    spectrum = my_dft(time_array, motion, quantities=('frequency', 'amplitude'))
+    return lambda: my_hanning(spectrum['frequency'], spectrum['amplitude'], 0.5)
+
+
+def _case_lowpass(time_array, motion, workdir):
+    data = np.ascontiguousarray(motion.T)
+    return lambda: my_butter_lowpass_filter(data, cutoff=30, fs=FS)
+
+
+def _case_filter(time_array, motion, workdir):
+    record = Motion(time_array, motion)
+    return lambda: record.filter(btype='low', cutoff=30)
+
+
+def _case_decimate(time_array, motion, workdir):
+    record = Motion(time_array, motion)
+    return lambda: record.decimate(4)
+
+
+def _case_rpt_reader(time_array, motion, workdir):
+    path = os.path.join(workdir, f'bench_{motion.shape[0]}_{motion.shape[1]}.rpt')
+    if not os.path.exists(path):
+        write_rpt(path, time_array, motion)
+    return lambda: rpt_reader(path, header=1, cache=False)
+
+
+def _case_csv_reader(time_array, motion, workdir):
+    path = os.path.join(workdir, f'bench_{motion.shape[0]}_{motion.shape[1]}.csv')
+    if not os.path.exists(path):
+        write_csv(path, time_array, motion)
+    return lambda: csv_reader(path, header=0, index_col=None, drop_labels=[], cache=False)
+
+
+def _case_plot(time_array, motion, workdir):
+    channels = ChannelSet(time_array, motion)
+    path = os.path.join(workdir, 'bench_plot')
+    return lambda: Export2D(channels).plot_single(is_show=False, fig_save_name=path, fig_save_format=('png',),
+                                                  dpi=100)
+
+
+def _case_csv_export(time_array, motion, workdir):
+    channels = ChannelSet(time_array, motion)
+    path = os.path.join(workdir, 'bench_export.csv')
+    return lambda: ExportArray.export_to_csv(channels, path)
+
+
+# name: (case, largest samples × channels the case is run on)
+BENCHMARKS = {'my_dft': (_case_dft, 10 ** 9),
+              'Motion.dft': (_case_motion_dft, 10 ** 9),
+              'my_hanning': (_case_hanning, 10 ** 8),
+              'butter_lowpass_filter': (_case_lowpass, 10 ** 9),
+              'Motion.filter': (_case_filter, 10 ** 9),
+              'Motion.decimate': (_case_decimate, 10 ** 9),
+              'rpt_reader': (_case_rpt_reader, 10 ** 7),
+              'csv_reader': (_case_csv_reader, 10 ** 7),
+              'Export2D.plot_single': (_case_plot, 10 ** 7),
+              'ExportArray.export_to_csv': (_case_csv_export, 10 ** 7)}
+
+
+def time_call(func, repeat=3, min_time=0.2, max_number=1000):
+    """
+        timeit-like timing, the call is looped until one measurement lasts min_time
+    :return: dictionary, best and median seconds per call, number of calls per measurement
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= max_number:
+            break
+        number = min(max_number, number * max(2, int(min_time / max(elapsed, 1e-9))))
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {'best': min(timings), 'median': float(np.median(timings)), 'number': number}
+
+
+def run_benchmarks(cases=None, sizes=None, repeat=3, min_time=0.2, workdir=None, verbose=False):
+    """
+    :param cases: names in BENCHMARKS, None for all
+    :param sizes: list of (samples, channels), default SIZES
+    :param repeat: measurements per case, the best one is compared
+    :param min_time: seconds of one measurement, short calls are looped
+    :param workdir: folder of the generated .rpt/.csv files and exports, default a temporary folder
+    :param verbose: print every result
+    :return: dictionary
+    meta: python, numpy, platform and date of the run
+    results: {'case[samples x channels]': {'case', 'samples', 'channels', 'best', 'median', 'number'}}
+    """
+    cases = list(BENCHMARKS) if cases is None else list(cases)
+    unknown = [case for case in cases if case not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f'unknown benchmarks {unknown}, choose from {list(BENCHMARKS)}')
+    sizes = SIZES if sizes is None else sizes
+    temporary = workdir is None
+    workdir = tempfile.mkdtemp(prefix='my_benchmark_') if temporary else workdir
+    os.makedirs(workdir, exist_ok=True)
+    results = {}
+    try:
+        for n_samples, n_channels in sizes:
+            time_array, motion = synthetic_motion(n_samples, n_channels)
+            for name in cases:
+                case, max_values = BENCHMARKS[name]
+                if n_samples * n_channels > max_values:
+                    continue
+                timing = time_call(case(time_array, motion, workdir), repeat=repeat, min_time=min_time)
+                key = f'{name}[{n_samples}x{n_channels}]'
+                results[key] = dict(case=name, samples=n_samples, channels=n_channels, **timing)
+                if verbose:
+                    print(f"{key:<45s} {timing['best'] * 1e3:12.3f} ms")
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+    meta = {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+    return {'meta': meta, 'results': results}
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+        compare the best timings of two runs of run_benchmarks
+    :param results: dictionary of run_benchmarks or of a json file written by it
+    :param baseline: the same for the reference run
+    :param threshold: allowed relative slowdown, 0.2 for 20 %
+    :return: list of dictionaries {'key', 'baseline', 'current', 'ratio', 'regression'} of the common cases
+    """
+    rows = []
+    for key, current in results['results'].items():
+        if key not in baseline['results']:
+            continue
+        reference = baseline['results'][key]['best']
+        ratio = current['best'] / reference
+        rows.append({'key': key, 'baseline': reference, 'current': current['best'], 'ratio': ratio,
+                     'regression': ratio > 1 + threshold})
+    return rows
+
+
+def print_comparison(rows, file=sys.stdout):
+    print(f"{'benchmark':<45s} {'baseline ms':>12s} {'current ms':>12s} {'speed-up':>9s}", file=file)
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['key']:<45s} {row['baseline'] * 1e3:12.3f} {row['current'] * 1e3:12.3f} "
+              f"{1 / row['ratio']:8.2f}x{flag}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the signal, reader and export hot paths on synthetic data.')
+    parser.add_argument('--output', help='json file of the results')
+    parser.add_argument('--baseline', help='json file of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown, default 0.2')
+    parser.add_argument('--case', action='append', help=f'benchmark to run, repeatable, from {list(BENCHMARKS)}')
+    parser.add_argument('--size', action='append', help='samples x channels, e.g. 100000x8, repeatable')
+    parser.add_argument('--quick', action='store_true', help='smallest sizes only')
+    parser.add_argument('--full', action='store_true', help='up to 1e7 samples and 128 channels')
+    parser.add_argument('--repeat', type=int, default=3, help='measurements per case')
+    parser.add_argument('--workdir', help='folder of the generated files, default a temporary folder')
+    args = parser.parse_args(argv)
+    # the Calibri fallback warning is printed on every figure
+    logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+    if args.size:
+        sizes = [tuple(int(float(n)) for n in size.lower().split('x')) for size in args.size]
+    else:
+        sizes = QUICK_SIZES if args.quick else FULL_SIZES if args.full else SIZES
+    results = run_benchmarks(args.case, sizes, repeat=args.repeat, workdir=args.workdir, verbose=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, threshold=args.threshold)
+        print_comparison(rows)
+        return 1 if any(row['regression'] for row in rows) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+import numpy as np
+
+
+def sample_interval(time):
+    """
+        time step of an equally spaced time base, averaged over the record so that rounded time columns give the
+    nominal rate, e.g. 0.005 s for times written with 3 decimals at 200 Hz
+    :param time: numpy.ndarray (samples,), at least two samples
+    :return: dt
+    """
+    return (time[-1] - time[0]) / (len(time) - 1)
+
+
+class ChannelSet:
+    """
+        Channels of one run on a shared x axis
+    One contiguous (samples × channels) buffer and one x array replace a list of Line objects that each carry a
+    copy of the same time vector. Channels are returned as views of the buffer, nothing is copied.
+    Motion, Export2D, export_lines and ExportArray.export_to_csv accept a ChannelSet directly.
+    """
+
+    __slots__ = ('x', 'data', 'names', 'units', 'x_name', 'x_unit')
+
+    def __init__(self, x: 'np.ndarray|list', data: 'np.ndarray|list', names: list = None, units: list = None,
+                 x_name: str = 'time', x_unit: str = 's'):
+        """
+        :param x: shared x axis (samples,)
+        :param data: (samples, channels) or (samples,) for one channel
+        :param names: channel names, default ch0, ch1 ...
+        :param units: channel units, default ''
+        :param x_name: name of the x axis
+        :param x_unit: unit of the x axis
+        """
+        self.x = np.asarray(x)
+        data = np.asarray(data)
+        self.data = data.reshape(len(data), -1) if data.ndim == 1 else data
+        if self.data.ndim != 2 or len(self.x) != self.data.shape[0]:
+            raise ValueError(f'data of shape {data.shape} does not match x of length {len(self.x)}')
+        n = self.data.shape[1]
+        self.names = [f'ch{i}' for i in range(n)] if names is None else list(names)
+        self.units = [''] * n if units is None else list(units)
+        if len(self.names) != n or len(self.units) != n:
+            raise ValueError(f'{n} channels need {n} names and units')
+        self.x_name = x_name
+        self.x_unit = x_unit
+
+    @classmethod
+    def from_lines(cls, lines: list, units: list = None):
+        """
+        :param lines: Line objects with equal x
+        :return: ChannelSet, the y arrays are copied into one buffer
+        """
+        x = np.asarray(lines[0].x)
+        if not all(line.x is lines[0].x or np.array_equal(line.x, x) for line in lines):
+            raise ValueError('the lines do not share the same x')
+        data = np.column_stack([np.asarray(line.y) for line in lines])
+        return cls(x, data, [line.y_name for line in lines], units, x_name=lines[0].x_name)
+
+    @classmethod
+    def from_dataframe(cls, data_df, x_col=0, units: list = None, x_unit: str = 's'):
+        """
+            e.g. ChannelSet.from_dataframe(rpt_reader(fp)), first column: time
+        :param data_df: pandas DataFrame
+        :param x_col: position of the x column
+        :return: ChannelSet, x and the channels keep their dtypes, e.g. float64 time and float32 channels
+        """
+        columns = [str(col) for col in data_df.columns]
+        channel_index = [i for i in range(len(columns)) if i != x_col]
+        return cls(data_df.iloc[:, x_col].to_numpy(), np.ascontiguousarray(data_df.iloc[:, channel_index].to_numpy()),
+                   [columns[i] for i in channel_index], units, x_name=columns[x_col], x_unit=x_unit)
+
+    @property
+    def n_samples(self):
+        return self.data.shape[0]
+
+    @property
+    def n_channels(self):
+        return self.data.shape[1]
+
+    def __len__(self):
+        return self.n_channels
+
+    def __iter__(self):
+        for i in range(self.n_channels):
+            yield self.data[:, i]
+
+    def __getitem__(self, key: 'int|str'):
+        """
+        :param key: position or name of the channel
+        :return: view (samples,) of the channel
+        """
+        return self.data[:, self.index(key)]
+
+    def __repr__(self):
+        return f'ChannelSet({self.n_samples} samples x {self.n_channels} channels: {self.names})'
+
+    def index(self, key: 'int|str'):
+        return key if isinstance(key, (int, np.integer)) else self.names.index(key)
+
+    def select(self, keys: list):
+        """
+        :param keys: positions or names of the channels
+        :return: ChannelSet of these channels on the same x, the buffer is copied unless keys is a contiguous run
+        """
+        index = [self.index(key) for key in keys]
+        if index and index == list(range(index[0], index[0] + len(index))):
+            data = self.data[:, index[0]: index[0] + len(index)]
+        else:
+            data = self.data[:, index]
+        return ChannelSet(self.x, data, [self.names[i] for i in index], [self.units[i] for i in index],
+                          x_name=self.x_name, x_unit=self.x_unit)
+
+    def line(self, key: 'int|str'):
+        """
+        :return: Line with views of x and of the channel
+        """
+        from my_output import Line
+        i = self.index(key)
+        return Line(self.x, self.data[:, i], self.x_name, self.names[i])
+
+    def lines(self):
+        """
+        :return: list of Line, one per channel, all sharing the same x array
+        """
+        return [self.line(i) for i in range(self.n_channels)]
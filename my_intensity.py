@@ -0,0 +1,300 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+"""
+    Ground motion intensity measures of every channel
+The measures are cumulative sums or reductions along the time axis of the (samples × channels) record, the running
+values use cumulative sums and maxima inside blocks of one window, so no Python loop runs over the samples or
+windows.
+    measures = intensity_measures(acc, dt, scale=9.81)     # acceleration in g
+    measures['pga'], measures['arias'], measures['d5_95'], measures['cav']
+    rms = running_rms(acc, window=200)
+or Motion.intensity_measures(...) and Motion.running_rms(...). IntensityAccumulator gives the same values block by
+block, e.g. from my_rpt.rpt_chunk_reader. Integrals use the trapezoidal rule, sums of squares are accumulated in
+float64 for every input dtype.
+references:
+1. Arias A. A measure of earthquake intensity. Seismic design for nuclear power plants, MIT Press, 1970.
+2. Trifunac M.D., Brady A.G. A study on the duration of strong earthquake ground motion. BSSA, 1975.
+3. EPRI. A criterion for determining exceedance of the operating basis earthquake. EPRI NP-5930, 1988.
+"""
+
+import numpy as np
+
+from my_profile import profiled
+
+G = 9.81
+
+
+def _as_2d(data):
+    data = np.asarray(data)
+    return data.reshape(len(data), -1), data.ndim == 1
+
+
+def _squeeze(value, one_channel):
+    return value[..., 0] if one_channel else value
+
+
+def _per_channel(value, one_channel):
+    """
+        (channels,) measure, a python float or int for one channel
+    """
+    return value[0].item() if one_channel else value
+
+
+def running_rms(data, window):
+    """
+        root mean square of every window of samples, see _window_reduce
+    :param data: ndarray (samples,) or (samples, channels)
+    :param window: samples per window
+    :return: float64 ndarray (samples - window + 1,) or (samples - window + 1, channels), value k is the rms of
+    samples k ... k + window - 1
+    """
+    data, one_channel = _as_2d(data)
+    return _squeeze(np.sqrt(_window_reduce(np.square(data, dtype=np.float64), window) / window), one_channel)
+
+
+def running_peak(data, window):
+    """
+        largest absolute value of every window of samples, see _window_reduce
+    :return: ndarray (samples - window + 1,) or (samples - window + 1, channels)
+    """
+    data, one_channel = _as_2d(data)
+    return _squeeze(_window_reduce(np.abs(data), window, np.maximum), one_channel)
+
+
+def _window_reduce(data, window, ufunc=np.add):
+    """
+        reduction of every window of samples (windows, channels) in O(samples), van Herk / Gil-Werman
+    The record is cut into blocks of window samples and a window starting at sample r of block b reduces the
+    suffix of block b from r and the prefix of block b + 1 before r, both accumulated inside one block on a
+    reshaped view. For sums, unlike the difference of two cumulative sums of the record, a quiet window after a
+    strong motion loses no precision.
+    :param data: (samples, channels)
+    :param ufunc: np.add for sums, np.maximum or np.minimum
+    """
+    n, channels = data.shape
+    n_windows = max(n - window + 1, 0)
+    n_blocks = -(-n // window)
+    # the padding only enters windows past the end of the record, which are dropped
+    blocks = np.zeros((n_blocks * window, channels), dtype=data.dtype)
+    blocks[:n] = data
+    blocks = blocks.reshape(n_blocks, window, channels)
+    result = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1]
+    result[:-1, 1:] = ufunc(result[:-1, 1:], ufunc.accumulate(blocks[1:, :-1], axis=1))
+    return result.reshape(-1, channels)[:n_windows]
+
+
+def pga(data):
+    """
+    :return: peak absolute value (channels,) and its sample (channels,), a float and an int for one channel
+    """
+    data, one_channel = _as_2d(data)
+    index = np.argmax(np.abs(data), axis=0)
+    return _per_channel(np.abs(data[index, np.arange(data.shape[1])]), one_channel), _per_channel(index, one_channel)
+
+
+def husid(data, dt, scale=1., g=G):
+    """
+        cumulative Arias intensity pi / (2 g) * integral of a^2 dt, trapezoidal rule
+    :param data: acceleration (samples,) or (samples, channels)
+    :param dt: time step
+    :param scale: factor from the unit of data to m/s^2, e.g. 9.81 for g
+    :param g: gravity acceleration (m/s^2)
+    :return: float64 ndarray, same shape as data, starting at 0 (m/s)
+    """
+    data, one_channel = _as_2d(data)
+    square = np.square(data, dtype=np.float64)
+    cumulative = np.zeros(data.shape)
+    np.cumsum((square[1:] + square[:-1]) * (np.pi / (2 * g) * scale ** 2 * dt / 2), axis=0, out=cumulative[1:])
+    return _squeeze(cumulative, one_channel)
+
+
+def arias_intensity(data, dt, scale=1., g=G):
+    """
+    :return: Arias intensity (channels,) in m/s, a float for one channel, see husid
+    """
+    data, one_channel = _as_2d(data)
+    square = np.square(data, dtype=np.float64)
+    total = np.pi / (2 * g) * scale ** 2 * dt * (square.sum(axis=0) - (square[0] + square[-1]) / 2)
+    return _per_channel(total, one_channel)
+
+
+def _crossing(cumulative, level, samples=None):
+    """
+        first sample at which every column of the non-decreasing cumulative reaches level, interpolated linearly
+    :param cumulative: (points, channels)
+    :param level: (channels,)
+    :param samples: sample of every point (points,), None for 0, 1, 2 ...
+    :return: float (channels,)
+    """
+    samples = np.arange(len(cumulative)) if samples is None else samples
+    index = np.argmax(cumulative >= level, axis=0)
+    previous = np.maximum(index - 1, 0)
+    columns = np.arange(cumulative.shape[1])
+    low, high = cumulative[previous, columns], cumulative[index, columns]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where((high > low) & (index > 0), (level - low) / (high - low), 0.)
+    return samples[previous] + fraction * (samples[index] - samples[previous])
+
+
+def significant_duration(data, dt, bounds=(0.05, 0.95)):
+    """
+        time between the bounds of the normalized Arias intensity, D5-95 by default
+    :param data: acceleration (samples,) or (samples, channels)
+    :param dt: time step
+    :param bounds: fractions of the total Arias intensity
+    :return: duration (channels,), start (channels,) time from the first sample to the lower bound, floats for one
+    channel
+    """
+    data, one_channel = _as_2d(data)
+    cumulative = husid(data, dt)
+    total = cumulative[-1]
+    start = _crossing(cumulative, bounds[0] * total) * dt
+    end = _crossing(cumulative, bounds[1] * total) * dt
+    return _per_channel(end - start, one_channel), _per_channel(start, one_channel)
+
+
+def cav(data, dt, scale=1.):
+    """
+        cumulative absolute velocity, integral of |a| dt, trapezoidal rule
+    :param scale: factor from the unit of data to the unit of the result, e.g. 9.81 for g to m/s
+    :return: (channels,), a float for one channel
+    """
+    data, one_channel = _as_2d(data)
+    absolute = np.abs(data).astype(np.float64)
+    total = scale * dt * (absolute.sum(axis=0) - (absolute[0] + absolute[-1]) / 2)
+    return _per_channel(total, one_channel)
+
+
+@profiled()
+def intensity_measures(data, dt, scale=1., g=G, bounds=(0.05, 0.95)):
+    """
+        all intensity measures of every channel
+    :param data: acceleration (samples,) or (samples, channels)
+    :param dt: time step
+    :param scale: factor from the unit of data to m/s^2, e.g. 9.81 for g
+    :param g: gravity acceleration (m/s^2)
+    :param bounds: bounds of the significant duration
+    :return: dictionary of (channels,) arrays, floats for one channel
+    pga: peak absolute acceleration, unit of data
+    pga_time: time of pga from the first sample
+    rms: root mean square of the record, unit of data
+    arias: Arias intensity (m/s)
+    d5_95: significant duration between the bounds (s)
+    d5_95_start: time of the lower bound from the first sample
+    cav: cumulative absolute velocity (m/s)
+    """
+    data, one_channel = _as_2d(data)
+    peak, index = pga(data)
+    cumulative = husid(data, dt, scale=scale, g=g)
+    total = cumulative[-1]
+    start = _crossing(cumulative, bounds[0] * total) * dt
+    measures = {'pga': peak, 'pga_time': index * dt,
+                'rms': np.sqrt(np.square(data, dtype=np.float64).mean(axis=0)),
+                'arias': total, 'd5_95': _crossing(cumulative, bounds[1] * total) * dt - start, 'd5_95_start': start,
+                'cav': cav(data, dt, scale=scale)}
+    return {name: _per_channel(value, one_channel) for name, value in measures.items()}
+
+
+class IntensityAccumulator:
+    """
+        Intensity measures of a record pushed in blocks
+    Peak, sums and integrals are carried from block to block, the trapezoid between two blocks uses the last sample
+    of the previous one. The significant duration needs the normalized Arias curve of the whole record, the curve is
+    kept every resolution seconds and interpolated linearly, resolution=None keeps every sample (exact).
+    accumulator = IntensityAccumulator(dt=0.005, scale=9.81, rms_window=200)
+    for time, data, columns in rpt_chunk_reader('run01.rpt'):
+        rms = accumulator.push(data)        # running rms of the windows completed by the block
+    measures = accumulator.result()         # as intensity_measures of the whole record
+    """
+
+    def __init__(self, dt, scale=1., g=G, bounds=(0.05, 0.95), rms_window=None, resolution=None):
+        """
+        :param dt: time step
+        :param scale: see intensity_measures
+        :param g: see intensity_measures
+        :param bounds: see intensity_measures
+        :param rms_window: samples per window of the running rms returned by push, None for no running rms
+        :param resolution: time step of the kept Arias curve, None for every sample
+        """
+        self.dt = dt
+        self.scale = scale
+        self.g = g
+        self.bounds = bounds
+        self.rms_window = rms_window
+        self.step = 1 if resolution is None else max(1, int(round(resolution / dt)))
+        self.reset()
+
+    def reset(self):
+        """
+            forget the pushed blocks
+        """
+        self.n = 0
+        self._one_channel = False
+        self._peak = self._peak_index = None
+        self._sum_square = self._arias = self._cav = None
+        self._last = None
+        # kept points of the cumulative Arias intensity and their samples
+        self._curve, self._curve_index = [], []
+        # last rms_window - 1 squared samples
+        self._tail = None
+
+    def push(self, block):
+        """
+        :param block: acceleration (samples,) or (samples, channels), the channel count must not change
+        :return: running rms of the windows that end in this block, see running_rms, None without rms_window
+        """
+        block, self._one_channel = _as_2d(block)
+        square = np.square(block, dtype=np.float64)
+        absolute = np.abs(block).astype(np.float64)
+        if self._peak is None:
+            self._peak = np.zeros(block.shape[1])
+            self._peak_index = np.zeros(block.shape[1], dtype=int)
+            self._sum_square, self._arias, self._cav = (np.zeros(block.shape[1]) for _ in range(3))
+        index = np.argmax(absolute, axis=0)
+        peak = absolute[index, np.arange(block.shape[1])]
+        larger = peak > self._peak
+        self._peak = np.where(larger, peak, self._peak)
+        self._peak_index = np.where(larger, self.n + index, self._peak_index)
+        self._sum_square += square.sum(axis=0)
+        rms = None if self.rms_window is None else self._running_rms(square)
+        # trapezoids from the last sample of the previous block, the negated first sample of the record gives 0
+        last_square, last_absolute = self._last if self._last is not None else (-square[0], -absolute[0])
+        square = np.concatenate([last_square[None], square])
+        absolute = np.concatenate([last_absolute[None], absolute])
+        cumulative = self._arias + np.cumsum((square[1:] + square[:-1]) *
+                                             (np.pi / (2 * self.g) * self.scale ** 2 * self.dt / 2), axis=0)
+        # the curve is kept on the samples that are multiples of step and at the end of every block
+        samples = self.n + np.arange(len(block))
+        keep = samples % self.step == 0
+        keep[-1] = True
+        self._curve.append(cumulative[keep])
+        self._curve_index.append(samples[keep])
+        self._arias = cumulative[-1].copy()
+        self._cav += self.scale * self.dt * (absolute[1:] + absolute[:-1]).sum(axis=0) / 2
+        self._last = square[-1].copy(), absolute[-1].copy()
+        self.n += len(block)
+        return rms
+
+    def _running_rms(self, square):
+        if self._tail is not None:
+            square = np.concatenate([self._tail, square])
+        self._tail = square[max(len(square) - self.rms_window + 1, 0):]
+        return _squeeze(np.sqrt(_window_reduce(square, self.rms_window) / self.rms_window), self._one_channel)
+
+    def result(self):
+        """
+        :return: dictionary, see intensity_measures
+        """
+        if self._peak is None:
+            raise ValueError('no block was pushed')
+        curve, curve_index = np.concatenate(self._curve), np.concatenate(self._curve_index)
+        total = self._arias
+        times = [_crossing(curve, bound * total, curve_index) * self.dt for bound in self.bounds]
+        measures = {'pga': self._peak, 'pga_time': self._peak_index * self.dt,
+                    'rms': np.sqrt(self._sum_square / self.n), 'arias': total, 'd5_95': times[1] - times[0],
+                    'd5_95_start': times[0], 'cav': self._cav}
+        return {name: _per_channel(value, self._one_channel) for name, value in measures.items()}
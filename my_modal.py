@@ -0,0 +1,149 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+"""
+    Frequency domain decomposition (FDD) of white-noise runs
+The cross-spectral density matrix G(f) of all channels is decomposed at every frequency line by one stacked SVD,
+the first singular value s1(f) peaks at the natural frequencies and its singular vector is the mode shape.
+    result = fdd(motion, fs, frequency_range=(0.5, 30))
+    result['natural_frequency'], result['damping'], result['mode_shapes']
+or Motion.fdd(...). Damping ratios are half-power estimates on s1, (f2 - f1) / (2 fn).
+references:
+1. Brincker R., Zhang L., Andersen P. Modal identification of output-only systems using frequency domain
+decomposition. Smart Materials and Structures, 2001.
+"""
+
+import numpy as np
+
+from my_profile import profiled
+from my_spectral import csd_matrix
+
+
+@profiled()
+def singular_value_spectrum(g, n_singular=None, vectors=False):
+    """
+        singular values of the cross-spectral density matrices of all frequency lines in one stacked call
+    G is Hermitian positive semi-definite, its SVD is the eigendecomposition (numpy svd with hermitian=True).
+    :param g: complex ndarray (bins, channels, channels)
+    :param n_singular: number of singular values kept, None for all
+    :param vectors: also return the singular vectors
+    :return: s (bins, n_singular) in descending order, and u (bins, channels, n_singular) with vectors
+    """
+    if vectors:
+        u, s, _ = np.linalg.svd(g, hermitian=True)
+        return s[:, :n_singular], u[:, :, :n_singular]
+    s = np.linalg.svd(g, compute_uv=False, hermitian=True)
+    return s[:, :n_singular]
+
+
+def pick_peaks(frequency, s1, n_modes=None, prominence=0.5, min_distance=None):
+    """
+        natural frequencies from the peaks of the first singular value
+    :param frequency: (bins,)
+    :param s1: (bins,) first singular value
+    :param n_modes: keep the n_modes highest peaks, None for every peak of the prominence
+    :param prominence: prominence of a peak in decades of s1 (log10)
+    :param min_distance: minimum distance between peaks (Hz)
+    :return: bins of the peaks in ascending frequency
+    """
+    from scipy.signal import find_peaks
+    with np.errstate(divide='ignore'):
+        log_s1 = np.log10(s1)
+    log_s1[~np.isfinite(log_s1)] = np.nanmin(log_s1[np.isfinite(log_s1)]) if np.isfinite(log_s1).any() else 0.
+    distance = None
+    if min_distance is not None:
+        distance = max(1, int(round(min_distance / (frequency[1] - frequency[0]))))
+    peaks, _ = find_peaks(log_s1, prominence=prominence, distance=distance)
+    if n_modes is not None:
+        peaks = np.sort(peaks[np.argsort(s1[peaks])[::-1][:n_modes]])
+    return peaks
+
+
+def half_power_damping(frequency, s1, peaks):
+    """
+        half-power bandwidth damping ratio of every peak, s1 is a power quantity so the limits are at s1(peak) / 2
+    The crossing frequencies are interpolated linearly between frequency lines.
+    :return: damping (peaks,), nan where s1 does not fall to half power on both sides
+    """
+    damping = np.full(len(peaks), np.nan)
+    for k, peak in enumerate(peaks):
+        half = s1[peak] / 2
+        below = np.flatnonzero(s1[:peak] < half)
+        above = np.flatnonzero(s1[peak:] < half)
+        if not len(below) or not len(above):
+            continue
+        i = below[-1]
+        j = peak + above[0]
+        f1 = np.interp(half, [s1[i], s1[i + 1]], [frequency[i], frequency[i + 1]])
+        # s1 decreases from j - 1 to j, np.interp needs increasing x
+        f2 = np.interp(half, [s1[j], s1[j - 1]], [frequency[j], frequency[j - 1]])
+        damping[k] = (f2 - f1) / (2 * frequency[peak])
+    return damping
+
+
+def normalize_modes(u):
+    """
+        rotate every mode so that its largest component is real and positive, and scale it to 1
+    :param u: complex (channels, modes)
+    :return: complex (channels, modes)
+    """
+    largest = u[np.argmax(np.abs(u), axis=0), np.arange(u.shape[1])]
+    return u / largest
+
+
+def mac(phi_a, phi_b):
+    """
+        modal assurance criterion of every pair of modes
+    :param phi_a: (channels, modes a)
+    :param phi_b: (channels, modes b)
+    :return: (modes a, modes b) in [0, 1]
+    """
+    cross = np.abs(np.conj(phi_a).T @ phi_b) ** 2
+    return cross / np.outer(np.sum(np.abs(phi_a) ** 2, axis=0), np.sum(np.abs(phi_b) ** 2, axis=0))
+
+
+@profiled()
+def fdd(motion, fs, nperseg=2048, noverlap=None, window='hann', frequency_range=None, n_modes=None, prominence=0.5,
+        min_distance=None, n_singular=3, csd=None, **options):
+    """
+        FDD modal identification from all channels of a run
+    :param motion: ndarray (samples, channels)
+    :param fs: sampling frequency
+    :param nperseg: samples per segment of the Welch estimate, frequency resolution fs / nperseg
+    :param noverlap: see my_spectral.welch
+    :param window: see my_spectral.welch
+    :param frequency_range: (low, high) frequency band searched for modes, limits the memory of G
+    :param n_modes: see pick_peaks
+    :param prominence: see pick_peaks
+    :param min_distance: see pick_peaks
+    :param n_singular: singular values returned per frequency line
+    :param csd: (frequency, g) from my_spectral.csd_matrix instead of estimating it from motion
+    :param options: keyword arguments of my_spectral.csd_matrix
+    :return: dictionary
+    frequency (bins,)
+    singular_values (bins, n_singular)
+    peaks: frequency lines of the modes (modes,)
+    natural_frequency (modes,)
+    damping: half-power damping ratio (modes,)
+    mode_shapes: complex (channels, modes), largest component 1
+    mac: (modes, modes) modal assurance criterion between the identified modes
+    """
+    if csd is None:
+        frequency, g = csd_matrix(motion, fs, nperseg=nperseg, noverlap=noverlap, window=window,
+                                  frequency_range=frequency_range, **options)
+    else:
+        frequency, g = csd
+        if frequency_range is not None:
+            keep = (frequency >= frequency_range[0]) & (frequency <= frequency_range[1])
+            frequency, g = frequency[keep], g[keep]
+    s = singular_value_spectrum(g, n_singular)
+    peaks = pick_peaks(frequency, s[:, 0], n_modes=n_modes, prominence=prominence, min_distance=min_distance)
+    # singular vectors only at the peaks
+    _, u = singular_value_spectrum(g[peaks], 1, vectors=True)
+    mode_shapes = normalize_modes(u[:, :, 0].T)
+    return {'frequency': frequency, 'singular_values': s, 'peaks': peaks, 'natural_frequency': frequency[peaks],
+            'damping': half_power_damping(frequency, s[:, 0], peaks), 'mode_shapes': mode_shapes,
+            'mac': mac(mode_shapes, mode_shapes)}
@@ -1,18 +1,45 @@
 # -*- coding:utf-8 -*-
 # Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>  
 # Established at:      2023/3/8 9:42     
-# Modified at:         2023/3/8 9:42                               
+# Modified at:         2026/10/17                               
 # Project:
 
-import matplotlib
-from matplotlib import cm
-from matplotlib import pyplot as plt
-import pandas as pd
+import importlib
+import os
+import time
+
 import numpy as np
 
+from my_channels import ChannelSet
+from my_profile import profiled
+
+# matplotlib and pandas are imported on the first plot or csv export, import my_output only loads numpy
+_rc_params_applied = False
 
-# plt.rcParams['font.sans-serif'] = 'Times New Roman'
-plt.rcParams['font.sans-serif'] = 'Calibri'
+
+def _matplotlib():
+    """
+        import matplotlib and apply the rcParams of this library once
+    """
+    global _rc_params_applied
+    import matplotlib
+    if not _rc_params_applied:
+        # plt.rcParams['font.sans-serif'] = 'Times New Roman'
+        matplotlib.rcParams['font.sans-serif'] = 'Calibri'
+        _rc_params_applied = True
+    return matplotlib
+
+
+def __getattr__(name):
+    """
+        my_output.plt, my_output.cm, my_output.matplotlib and my_output.pd are still available, loaded on access
+    """
+    modules = {'matplotlib': 'matplotlib', 'cm': 'matplotlib.cm', 'plt': 'matplotlib.pyplot', 'pd': 'pandas'}
+    if name in modules:
+        if name != 'pd':
+            _matplotlib()
+        return importlib.import_module(modules[name])
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class Line:
@@ -27,13 +54,220 @@ class Line:
         self.y_name = y_name
 
 
+def decimate_line(line: Line, method: str = None, n_out: int = 4000):
+    """
+        Reduce a long line to about n_out points for plotting, keeping the peaks
+    :param line: Line
+    :param method: None (no decimation), 'minmax' or 'lttb'
+    :param n_out: lines with at most n_out points are returned unchanged
+    :return: x, y
+    """
+    if method is None or len(line.x) <= n_out:
+        return line.x, line.y
+    if method == 'minmax':
+        return decimate_minmax(line.x, line.y, n_out // 2)
+    if method == 'lttb':
+        return decimate_lttb(line.x, line.y, n_out)
+    raise ValueError(f"unknown decimation method {method}, choose from None, 'minmax', 'lttb'")
+
+
+def decimate_minmax(x, y, n_buckets):
+    """
+        Keep the minimum and the maximum of y in each of n_buckets equal buckets, in x order
+    The first and last points are always kept, so the x range of the line does not change.
+    :return: x, y, at most 2 * n_buckets + 2 points, every point if there are no more than n_buckets
+    """
+    if n_buckets < 1:
+        raise ValueError(f'n_buckets must be at least 1, got {n_buckets}')
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    k = -(-n // n_buckets)
+    # pad with the last value to n_buckets * k points, then one row per bucket
+    padded = np.concatenate([y, np.full(n_buckets * k - n, y[-1])]).reshape(n_buckets, k)
+    offset = np.arange(n_buckets) * k
+    index = np.concatenate([[0], offset + padded.argmin(axis=1), offset + padded.argmax(axis=1), [n - 1]])
+    index = np.unique(np.minimum(index, n - 1))
+    return x[index], y[index]
+
+
+def decimate_lttb(x, y, n_out):
+    """
+        Largest-Triangle-Three-Buckets
+    Keeps the first and last points and, from each of n_out - 2 buckets, the point forming the largest triangle
+    with the point kept in the previous bucket and the average of the next bucket.
+    references:
+    1. Steinarsson S. Downsampling time series for visual representation. University of Iceland, 2013.
+    :return: x, y, n_out points, every point if there are no more than n_out
+    """
+    if n_out < 2:
+        raise ValueError(f'n_out must be at least 2 to keep the first and last points, got {n_out}')
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out:
+        return x, y
+    if n_out == 2:
+        return x[[0, -1]], y[[0, -1]]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    # averages of the buckets, the last point stands for the bucket after the last one
+    sum_x = np.add.reduceat(x[:n - 1], edges[:-1])
+    sum_y = np.add.reduceat(y[:n - 1], edges[:-1])
+    count = np.diff(edges)
+    avg_x = np.append(sum_x[1:] / count[1:], x[-1])
+    avg_y = np.append(sum_y[1:] / count[1:], y[-1])
+    index = np.empty(n_out, dtype=int)
+    index[0] = 0
+    index[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i]) * (y[lo: hi] - y[a]) - (x[a] - x[lo: hi]) * (avg_y[i] - y[a]))
+        a = lo + int(area.argmax())
+        index[i + 1] = a
+    return x[index], y[index]
+
+
+RASTER_FORMATS = ('png', 'jpg', 'jpeg', 'tif', 'tiff', 'webp')
+
+
+def _new_figure(is_show, **figure_kwargs):
+    """
+        pyplot figure to be shown, otherwise a plain Figure on the Agg canvas that pyplot does not keep alive
+    """
+    _matplotlib()
+    if is_show:
+        from matplotlib import pyplot as plt
+        return plt.figure(**figure_kwargs)
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(**figure_kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+@profiled()
+def save_figure(fig, fig_save_name, fig_save_format=('svg', 'png')):
+    """
+        Write a figure to several formats
+    Raster formats share one Agg rendering, vector formats are written by savefig.
+    :param fig: matplotlib.figure.Figure
+    :param fig_save_name: path without extension
+    :param fig_save_format: extensions
+    :return: None
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    raster = [fmt for fmt in fig_save_format if fmt.lower() in RASTER_FORMATS]
+    if raster and type(fig.canvas) is FigureCanvasAgg:
+        from PIL import Image
+        fig.canvas.draw()
+        image = Image.frombuffer('RGBA', fig.canvas.get_width_height(), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+        for fmt in raster:
+            (image if fmt.lower() in ('png', 'tif', 'tiff', 'webp') else image.convert('RGB')).save(
+                f'{fig_save_name}.{fmt}', dpi=(fig.dpi, fig.dpi))
+    else:
+        raster = []
+    for fmt in fig_save_format:
+        if fmt not in raster:
+            fig.savefig(f'{fig_save_name}.{fmt}', format=fmt)
+
+
+def render_batch(jobs, max_workers=None):
+    """
+        Render many Export2D figures headless in a process pool
+    Every job is built without pyplot on the Agg canvas, written to all its formats and released.
+    jobs = [(Export2D(lines), 'plot_single', {'fig_save_name': 'run01', 'fig_save_format': ('svg', 'png')}),
+            ...]
+    :param jobs: iterable of (Export2D, 'plot_single' or 'plot_multiple', keyword arguments of the method)
+    :param max_workers: number of processes, None for the number of cores, 0 to render in this process
+    :return: list of dictionaries in the order of jobs
+    name: fig_save_name of the job
+    seconds: wall time of building and writing the figure
+    error: None, or the error message of a failed job
+    """
+    jobs = list(jobs)
+    if max_workers == 0:
+        return [_render_job(job) for job in jobs]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_use_agg) as executor:
+        return list(executor.map(_render_job, jobs))
+
+
+def _use_agg():
+    _matplotlib().use('Agg')
+
+
+def _render_job(job):
+    export, method, kwargs = job
+    start = time.perf_counter()
+    try:
+        getattr(export, method)(**dict(kwargs, is_show=False))
+        error = None
+    except Exception as e:
+        error = repr(e)
+    return {'name': kwargs.get('fig_save_name'), 'seconds': time.perf_counter() - start, 'error': error}
+
+
 class Curve:
     """
-        3D curve definition
+        3D curve definition, z sampled on the grid of x and y
+    e.g. a spectrogram Curve(times, frequency, power) or the spectra of several runs Curve(frequency, runs, amplitude)
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, x_array: 'np.ndarray|list', y_array: 'np.ndarray|list', z_array: 'np.ndarray|list',
+                 x_name='', y_name='', z_name=''):
+        """
+        :param x_array: (nx,)
+        :param y_array: (ny,)
+        :param z_array: (ny, nx), row i belongs to y[i] as in z(meshgrid(x, y))
+        """
+        self.x = np.asarray(x_array)
+        self.y = np.asarray(y_array)
+        self.z = np.asarray(z_array)
+        if self.z.shape != (len(self.y), len(self.x)):
+            raise ValueError(f'z of shape {self.z.shape} does not match y ({len(self.y)}) and x ({len(self.x)})')
+        self.x_name = x_name
+        self.y_name = y_name
+        self.z_name = z_name
+
+
+def downsample_grid(x, y, z, max_shape, reduce='max'):
+    """
+        Reduce a grid to at most max_shape points by blocks of neighbouring points
+    Blocks are reduced with ufunc.reduceat, the grid is not padded or copied.
+    :param x: (nx,)
+    :param y: (ny,)
+    :param z: (ny, nx)
+    :param max_shape: (rows, columns) of the result, e.g. the pixels of the axes
+    :param reduce: 'max' keeps the peaks, 'mean' averages the blocks
+    :return: x, y at the block centres and z of the blocks
+    """
+    for axis, n_max in enumerate(max_shape):
+        n = z.shape[axis]
+        factor = int(np.ceil(n / max(int(n_max), 1)))
+        if factor <= 1:
+            continue
+        starts = np.arange(0, n, factor)
+        counts = np.diff(np.append(starts, n))
+        if reduce == 'max':
+            z = np.fmax.reduceat(z, starts, axis=axis)
+        elif reduce == 'mean':
+            z = np.add.reduceat(z, starts, axis=axis) / (counts if axis else counts[:, np.newaxis])
+        else:
+            raise ValueError(f"reduce must be 'max' or 'mean', got {reduce!r}")
+        centres = np.add.reduceat(np.asarray(x if axis else y, dtype=float), starts) / counts
+        if axis:
+            x = centres
+        else:
+            y = centres
+    return x, y, z
+
+
+def _is_uniform(a):
+    if len(a) < 3:
+        return True
+    step = np.diff(a)
+    return np.allclose(step, step[0], rtol=1e-6, atol=0)
 
 
 class Export2D:
@@ -41,25 +275,35 @@ class Export2D:
         2D plot library customization
     """
 
-    def __init__(self, lines: 'list|Line'):
+    def __init__(self, lines: 'list|Line|ChannelSet'):
+        """
+        :param lines: Line or list of Line for plot_single, list of lists of Line for plot_multiple
+                      a ChannelSet stands for the list of its channels, e.g. [channel_set_1, channel_set_2]
+        """
+        if isinstance(lines, ChannelSet):
+            lines = lines.lines()
+        elif isinstance(lines, (list, tuple)) and any(isinstance(item, ChannelSet) for item in lines):
+            lines = [item.lines() if isinstance(item, ChannelSet) else item for item in lines]
         self.line_array = lines
         if not hasattr(self.line_array, '__iter__'):  # if 1-dimensional
             self.line_array = [lines]
 
+    @profiled()
     def plot_single(self,
                     is_show: bool = True, fig_save_name: str = None, fig_save_format: tuple = ('svg', 'png'),
                     figsize: tuple = (6, 3), dpi: int = 300, fontsize: int = 16,
                     x_label: str = 'X-label', y_label: str = 'Y-label', title: str = None,
                     has_legend: bool = True, xlim: tuple = None, ylim: tuple = None,
                     line_property_grid: tuple = ('grey', '--', 0.3), line_property_plot: tuple = ('--', 1.5, None, 0),
-                    color_map: cm.colors = cm.Set2, color_id: tuple = None,
+                    color_map: 'cm.colors' = None, color_id: tuple = None,
                     fontsize_scaling_legend=1.2, fontsize_scaling_ticks=1.2, fig_layout='constrained', x_label_style='italic',
                     y_label_style='italic', title_style='italic', tick_direction='in', tick_axis='both', grid_axis='both',
-                    grid_which='major', legend_loc='best', legend_ncol=1, legend_labelspacing=0.1, legend_borderpad=0.2):
+                    grid_which='major', legend_loc='best', legend_ncol=1, legend_labelspacing=0.1, legend_borderpad=0.2,
+                    decimate: str = None, decimate_threshold: int = None):
 
         """
             plot in a single diagram
-        :param color_map: cm.greys/ cm.Set2
+        :param color_map: cm.greys/ cm.Set2, None for cm.Set2
         :param fontsize_scaling_ticks:
         :param fontsize_scaling_legend:
         :param fig_layout:
@@ -90,13 +334,22 @@ class Export2D:
         :param xlim:
         :param dpi:
         :param figsize:
-        :param is_show:
+        :param is_show: show the figure with pyplot, otherwise the figure is built without pyplot and released
+        :param decimate: None, 'minmax' or 'lttb', reduce long lines before plotting, see decimate_line
+        :param decimate_threshold: lines with more points are decimated to this number of points,
+                                   default 2 points per pixel of the figure width
         :return: None
         """
 
+        _matplotlib()
+        from matplotlib import cm
+        from matplotlib.colors import ListedColormap
+        if color_map is None:
+            color_map = cm.Set2
+
         # Colors: https://matplotlib.org/3.5.0/tutorials/colors/colormaps.html
         if not color_id:  # if color_id is not defined
-            if type(color_map) == matplotlib.colors.ListedColormap:  # continuously, usually 256 colors
+            if type(color_map) == ListedColormap:  # continuously, usually 256 colors
                 color_id = np.arange(0, color_map.N, 1)
             else:  # separated, usually less than 10
                 interval = int(color_map.N / (len(self.line_array) + 1))
@@ -107,9 +360,11 @@ class Export2D:
             line_property_plot_temp = []
             [line_property_plot_temp.append(line_property_plot) for _ in range(len(self.line_array))]
             line_property_plot = tuple(line_property_plot_temp)
-        fig, ax = plt.subplots(1, 1, figsize=figsize, dpi=dpi, layout=fig_layout)
+        fig = _new_figure(is_show, figsize=figsize, dpi=dpi, layout=fig_layout)
+        ax = fig.subplots(1, 1)
         for i, line in enumerate(self.line_array):
-            ax.plot(line.x, line.y, label=line.y_name, color=color_map(color_id[i]),
+            x, y = decimate_line(line, decimate, decimate_threshold or 2 * int(figsize[0] * dpi))
+            ax.plot(x, y, label=line.y_name, color=color_map(color_id[i]),
                     linestyle=line_property_plot[i][0], linewidth=line_property_plot[i][1],
                     marker=line_property_plot[i][2], markersize=line_property_plot[i][3])
 
@@ -138,11 +393,12 @@ class Export2D:
                       ncol=legend_ncol, labelspacing=legend_labelspacing, borderpad=legend_borderpad)
 
         # Save Figure
-        for fmt in fig_save_format:
-            plt.savefig(f'{fig_save_name}.{fmt}', format=fmt)
+        if fig_save_name:
+            save_figure(fig, fig_save_name, fig_save_format)
 
         # Show figure in IDE
         if is_show:
+            from matplotlib import pyplot as plt
             plt.show(block=True)
 
     def csv_single(self, path):
@@ -153,10 +409,12 @@ class Export2D:
             data_list.append(line.y)
             columns_list.append(line.x_name)
             columns_list.append(line.y_name)
+        import pandas as pd
         data_array = np.transpose(np.array(data_list))
         df = pd.DataFrame(data=data_array, columns=columns_list)
         df.to_csv(path)
 
+    @profiled()
     def plot_multiple(self,
                       is_show: bool = True, fig_save_name: str = None, fig_save_format: tuple = ('svg', 'png'),
                       figsize: tuple = (6, 3), dpi: int = 300, fontsize: int = 16, fig_col_num=1,
@@ -166,16 +424,17 @@ class Export2D:
                       has_legend: bool = True, xlim: tuple = None, ylim: tuple = None,
                       line_property_grid: tuple = ('grey', '--', 0.3),
                       line_property_plot: tuple = ('-', 1.5, None, 0),
-                      color_map: cm.colors = cm.Set2, color_id: tuple = None,
+                      color_map: 'cm.colors' = None, color_id: tuple = None,
                       fontsize_scaling_legend=1.2, fontsize_scaling_ticks=1.2, fig_layout='constrained', x_label_style='italic',
                       y_label_style='italic', title_style='italic', tick_direction='in', tick_axis='both', grid_axis='both',
-                      grid_which='major', legend_loc='best', legend_ncol=1, legend_labelspacing=0.1, legend_borderpad=0.2):
+                      grid_which='major', legend_loc='best', legend_ncol=1, legend_labelspacing=0.1, legend_borderpad=0.2,
+                      decimate: str = None, decimate_threshold: int = None):
 
         """
             plot in subplots
             Note that the parameters for every subplot should be identical!
         :param fig_col_num: column number of subplots
-        :param color_map: cm.greys/ cm.Set2
+        :param color_map: cm.greys/ cm.Set2, None for cm.Set2
         :param fontsize_scaling_ticks:
         :param fontsize_scaling_legend:
         :param fig_layout:
@@ -206,14 +465,23 @@ class Export2D:
         :param xlim:
         :param dpi:
         :param figsize:
-        :param is_show:
+        :param is_show: show the figure with pyplot, otherwise the figure is built without pyplot and released
+        :param decimate: None, 'minmax' or 'lttb', reduce long lines before plotting, see decimate_line
+        :param decimate_threshold: lines with more points are decimated to this number of points,
+                                   default 2 points per pixel of the figure width
         :return: None
         """
 
+        _matplotlib()
+        from matplotlib import cm
+        from matplotlib.colors import ListedColormap
+        if color_map is None:
+            color_map = cm.Set2
+
         fig_row_num = int(len(self.line_array) / fig_col_num)
-        fig, axes = plt.subplots(fig_row_num, fig_col_num,
-                                 figsize=(figsize[0] * fig_col_num, figsize[1] * fig_row_num),
-                                 dpi=dpi, layout=fig_layout)
+        fig = _new_figure(is_show, figsize=(figsize[0] * fig_col_num, figsize[1] * fig_row_num), dpi=dpi,
+                          layout=fig_layout)
+        axes = fig.subplots(fig_row_num, fig_col_num)
 
         if fig_col_num == 1 or fig_row_num == 1:
             for fig_num_i, single_line_array in enumerate(self.line_array):
@@ -226,7 +494,7 @@ class Export2D:
                 # Colors: https://matplotlib.org/3.5.0/tutorials/colors/colormaps.html
                 color_id_single_line = color_id
                 if not color_id_single_line:  # if color_id is not defined
-                    if type(color_map) == matplotlib.colors.ListedColormap:  # continuously, usually 256 colors
+                    if type(color_map) == ListedColormap:  # continuously, usually 256 colors
                         color_id_single_line = np.arange(0, color_map.N, 1)
                     else:  # separated, usually less than 10
                         interval = int(color_map.N / (len(single_line_array) + 1))
@@ -234,7 +502,8 @@ class Export2D:
 
                 # Line
                 for i, line in enumerate(single_line_array):
-                    axes[fig_num_i].plot(line.x, line.y, label=line.y_name, color=color_map(color_id_single_line[i]),
+                    x, y = decimate_line(line, decimate, decimate_threshold or 2 * int(figsize[0] * dpi))
+                    axes[fig_num_i].plot(x, y, label=line.y_name, color=color_map(color_id_single_line[i]),
                                          linestyle=line_property_plot[i][0], linewidth=line_property_plot[i][1],
                                          marker=line_property_plot[i][2], markersize=line_property_plot[i][3])
                 # Axis
@@ -271,7 +540,7 @@ class Export2D:
                     # Colors: https://matplotlib.org/3.5.0/tutorials/colors/colormaps.html
                     color_id_single_line = color_id
                     if not color_id_single_line:  # if color_id is not defined
-                        if type(color_map) == matplotlib.colors.ListedColormap:  # continuously, usually 256 colors
+                        if type(color_map) == ListedColormap:  # continuously, usually 256 colors
                             color_id_single_line = np.arange(0, color_map.N, 1)
                         else:  # separated, usually less than 10
                             interval = int(color_map.N / (len(self.line_array[fig_num_i]) + 1))
@@ -279,7 +548,8 @@ class Export2D:
 
                     # Line
                     for i, line in enumerate(self.line_array[fig_num_i]):
-                        axes[row, col].plot(line.x, line.y, label=line.y_name, color=color_map(color_id_single_line[i]),
+                        x, y = decimate_line(line, decimate, decimate_threshold or 2 * int(figsize[0] * dpi))
+                        axes[row, col].plot(x, y, label=line.y_name, color=color_map(color_id_single_line[i]),
                                             linestyle=line_property_plot[i][0], linewidth=line_property_plot[i][1],
                                             marker=line_property_plot[i][2], markersize=line_property_plot[i][3])
                     # Axis
@@ -302,11 +572,12 @@ class Export2D:
                         axes[row, col].legend(loc=legend_loc, fontsize=fontsize / fontsize_scaling_legend,
                                               ncol=legend_ncol, labelspacing=legend_labelspacing, borderpad=legend_borderpad)
         # Save Figure
-        for fmt in fig_save_format:
-            plt.savefig(f'{fig_save_name}.{fmt}', format=fmt)
+        if fig_save_name:
+            save_figure(fig, fig_save_name, fig_save_format)
 
         # Show figure in IDE
         if is_show:
+            from matplotlib import pyplot as plt
             plt.show(block=True)
 
     def csv_multiple(self, path):
@@ -318,25 +589,412 @@ class Export2D:
                 data_list.append(line.y)
                 columns_list.append(line.x_name)
                 columns_list.append(line.y_name)
+        import pandas as pd
         data_array = np.transpose(np.array(data_list))
         df = pd.DataFrame(data=data_array, columns=columns_list)
         df.to_csv(path)
 
+    def export(self, path, fmt=None, chunk_rows=100000, float_format=None):
+        """
+            export the lines to csv/npy/npz/hdf5/parquet with a shared x column and ragged lines, see export_lines
+        :return: list of the column names written
+        """
+        return export_lines(self.line_array, path, fmt=fmt, chunk_rows=chunk_rows, float_format=float_format)
+
 
 class Export3D:
     """
         3D plot library customization
+    Spectrogram heatmaps, waterfalls of spectra and surfaces of one Curve. The grid is reduced to the resolution of
+    the figure before plotting (see downsample_grid) and no meshgrid is built. Heatmaps and waterfall lines are
+    rasterized layers, so svg/pdf files stay small and fast to open while axes and text remain vectors.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, curve: Curve):
+        """
+        :param curve: Curve
+        """
+        self.curve = curve
+
+    def _grid(self, figsize, dpi, max_shape, reduce, log_scale):
+        curve = self.curve
+        if max_shape is None:
+            # one grid point per pixel of the figure
+            max_shape = (int(figsize[1] * dpi), int(figsize[0] * dpi))
+        x, y, z = downsample_grid(curve.x, curve.y, curve.z, max_shape, reduce=reduce)
+        if log_scale:
+            # after the reduction, on the small grid only; max commutes with the logarithm
+            with np.errstate(divide='ignore'):
+                z = 10 * np.log10(z)
+        return x, y, z
+
+    @profiled()
+    def plot_heatmap(self,
+                     is_show: bool = True, fig_save_name: str = None, fig_save_format: tuple = ('svg', 'png'),
+                     figsize: tuple = (6, 3), dpi: int = 300, fontsize: int = 16,
+                     x_label: str = None, y_label: str = None, z_label: str = None, title: str = None,
+                     xlim: tuple = None, ylim: tuple = None, vmin: float = None, vmax: float = None,
+                     color_map: str = 'viridis', log_scale: bool = False, has_colorbar: bool = True,
+                     max_shape: tuple = None, reduce: str = 'max', fontsize_scaling_ticks=1.2,
+                     fig_layout='constrained', x_label_style='italic', y_label_style='italic', title_style='italic',
+                     tick_direction='in'):
+        """
+            heatmap of z over x (horizontal) and y (vertical), e.g. a spectrogram
+        :param z_label: label of the colour bar, default z_name of the curve
+        :param vmin: lower limit of the colour scale
+        :param vmax: upper limit of the colour scale
+        :param color_map: name or matplotlib colormap
+        :param log_scale: plot 10*log10(z) (dB of a power quantity)
+        :param has_colorbar: draw the colour bar
+        :param max_shape: (rows, columns) of the plotted grid, default the pixels of the figure
+        :param reduce: 'max' or 'mean', see downsample_grid
+        other parameters: see Export2D.plot_single
+        :return: None
+        """
+        curve = self.curve
+        fig = _new_figure(is_show, figsize=figsize, dpi=dpi, layout=fig_layout)
+        ax = fig.subplots(1, 1)
+        x, y, z = self._grid(figsize, dpi, max_shape, reduce, log_scale)
+        if _is_uniform(x) and _is_uniform(y):
+            dx = (x[1] - x[0]) / 2 if len(x) > 1 else 0.5
+            dy = (y[1] - y[0]) / 2 if len(y) > 1 else 0.5
+            image = ax.imshow(z, origin='lower', aspect='auto', interpolation='nearest', cmap=color_map, vmin=vmin,
+                              vmax=vmax, extent=(x[0] - dx, x[-1] + dx, y[0] - dy, y[-1] + dy))
+        else:
+            # 1-D coordinates, pcolormesh builds the cell edges itself
+            image = ax.pcolormesh(x, y, z, shading='nearest', cmap=color_map, vmin=vmin, vmax=vmax,
+                                  rasterized=True)
+        ax.set(xlim=xlim, ylim=ylim)
+        ax.set_xlabel(curve.x_name if x_label is None else x_label, fontstyle=x_label_style, fontsize=fontsize)
+        ax.set_ylabel(curve.y_name if y_label is None else y_label, fontstyle=y_label_style, fontsize=fontsize)
+        ax.tick_params(axis='both', direction=tick_direction, labelsize=fontsize / fontsize_scaling_ticks)
+        ax.set_title(title, fontstyle=title_style, fontsize=fontsize)
+        if has_colorbar:
+            colorbar = fig.colorbar(image, ax=ax)
+            colorbar.set_label(curve.z_name if z_label is None else z_label, fontsize=fontsize)
+            colorbar.ax.tick_params(labelsize=fontsize / fontsize_scaling_ticks)
+        self._finish(fig, is_show, fig_save_name, fig_save_format)
+
+    @profiled()
+    def plot_waterfall(self,
+                       is_show: bool = True, fig_save_name: str = None, fig_save_format: tuple = ('svg', 'png'),
+                       figsize: tuple = (6, 4), dpi: int = 300, fontsize: int = 12,
+                       x_label: str = None, y_label: str = None, z_label: str = None, title: str = None,
+                       xlim: tuple = None, zlim: tuple = None, color_map: str = 'viridis', linewidth: float = 0.8,
+                       offset: float = None, log_scale: bool = False, n_points: int = None, view: tuple = (30, -60),
+                       fig_layout='constrained', title_style='italic'):
+        """
+            one line of z over x per y value, e.g. the spectra of successive runs
+        All lines are one rasterized line collection, every line is decimated to the figure width with decimate_minmax.
+        :param offset: None for a 3D waterfall, otherwise a 2D plot with line i shifted up by i * offset
+        :param n_points: points per line, default 2 per pixel of the figure width
+        :param view: (elevation, azimuth) of the 3D axes
+        :param zlim: limits of the z axis (3D) or of the vertical axis (2D)
+        :param log_scale: plot 10*log10(z)
+        other parameters: see plot_heatmap
+        :return: None
+        """
+        curve = self.curve
+        from matplotlib import colormaps
+        fig = _new_figure(is_show, figsize=figsize, dpi=dpi, layout=fig_layout)
+        n_points = n_points or 2 * int(figsize[0] * dpi)
+        # get_cmap takes names and Colormap objects, as imshow and plot_surface do
+        colors = colormaps.get_cmap(color_map)(np.linspace(0, 1, max(len(curve.y), 2)))
+        if xlim is not None:
+            keep = (curve.x >= xlim[0]) & (curve.x <= xlim[1])
+            x_all, z_all = curve.x[keep], curve.z[:, keep]
+        else:
+            x_all, z_all = curve.x, curve.z
+        lines = []
+        for i in range(len(curve.y)):
+            x, z = decimate_minmax(x_all, z_all[i], max(n_points // 2, 1)) if len(x_all) > n_points else \
+                (x_all, z_all[i])
+            if log_scale:
+                with np.errstate(divide='ignore'):
+                    z = 10 * np.log10(z)
+            lines.append((x, z))
+        if offset is None:
+            from mpl_toolkits.mplot3d.art3d import Line3DCollection
+            ax = fig.add_subplot(projection='3d')
+            segments = [np.column_stack([x, np.full(len(x), curve.y[i], dtype=float), z])
+                        for i, (x, z) in enumerate(lines)]
+            collection = Line3DCollection(segments, colors=colors[:len(lines)], linewidths=linewidth, rasterized=True)
+            ax.add_collection3d(collection)
+            z_min = min(np.nanmin(z[np.isfinite(z)]) for _, z in lines)
+            z_max = max(np.nanmax(z[np.isfinite(z)]) for _, z in lines)
+            ax.set(xlim=(x_all[0], x_all[-1]), ylim=(np.min(curve.y), np.max(curve.y)),
+                   zlim=zlim or (z_min, z_max))
+            ax.set_zlabel(curve.z_name if z_label is None else z_label, fontsize=fontsize)
+            ax.view_init(*view)
+        else:
+            from matplotlib.collections import LineCollection
+            ax = fig.subplots(1, 1)
+            segments = [np.column_stack([x, z + i * offset]) for i, (x, z) in enumerate(lines)]
+            collection = LineCollection(segments, colors=colors[:len(lines)], linewidths=linewidth, rasterized=True)
+            ax.add_collection(collection)
+            ax.autoscale_view()
+            ax.set(ylim=zlim)
+        ax.set_xlabel(curve.x_name if x_label is None else x_label, fontsize=fontsize)
+        ax.set_ylabel(curve.y_name if y_label is None else y_label, fontsize=fontsize)
+        ax.set_title(title, fontstyle=title_style, fontsize=fontsize)
+        self._finish(fig, is_show, fig_save_name, fig_save_format)
+
+    @profiled()
+    def plot_surface(self,
+                     is_show: bool = True, fig_save_name: str = None, fig_save_format: tuple = ('svg', 'png'),
+                     figsize: tuple = (6, 4), dpi: int = 300, fontsize: int = 12,
+                     x_label: str = None, y_label: str = None, z_label: str = None, title: str = None,
+                     color_map: str = 'coolwarm', max_shape: tuple = (200, 200), reduce: str = 'max',
+                     log_scale: bool = False, has_colorbar: bool = True, z_ticks: int = None, z_tick_format: str = None,
+                     view: tuple = (30, -60), fig_layout='constrained', title_style='italic'):
+        """
+            surface of z over the x-y grid
+        plot_surface draws one polygon per grid cell, the grid is reduced to max_shape first. X and Y are broadcast
+        views of x and y instead of a meshgrid.
+        :param max_shape: (rows, columns) of the plotted grid
+        :param z_ticks: number of ticks of the z axis, None for automatic ticks
+        :param z_tick_format: printf format of the z tick labels, e.g. '%.06f'
+        other parameters: see plot_heatmap
+        :return: None
+        """
+        curve = self.curve
+        fig = _new_figure(is_show, figsize=figsize, dpi=dpi, layout=fig_layout)
+        ax = fig.add_subplot(projection='3d')
+        x, y, z = self._grid(figsize, dpi, max_shape, reduce, log_scale)
+        surface = ax.plot_surface(np.broadcast_to(x, z.shape), np.broadcast_to(y[:, np.newaxis], z.shape), z,
+                                  linewidth=0, cmap=color_map, antialiased=False, rasterized=True)
+        if z_ticks:
+            from matplotlib.ticker import LinearLocator
+            ax.zaxis.set_major_locator(LinearLocator(z_ticks))
+        if z_tick_format:
+            from matplotlib.ticker import FormatStrFormatter
+            ax.zaxis.set_major_formatter(FormatStrFormatter(z_tick_format))
+        ax.set_xlabel(curve.x_name if x_label is None else x_label, fontsize=fontsize)
+        ax.set_ylabel(curve.y_name if y_label is None else y_label, fontsize=fontsize)
+        ax.set_zlabel(curve.z_name if z_label is None else z_label, fontsize=fontsize)
+        ax.set_title(title, fontstyle=title_style, fontsize=fontsize)
+        ax.view_init(*view)
+        if has_colorbar:
+            fig.colorbar(surface, ax=ax, shrink=1, aspect=10)
+        self._finish(fig, is_show, fig_save_name, fig_save_format)
+
+    @staticmethod
+    def _finish(fig, is_show, fig_save_name, fig_save_format):
+        # Save Figure
+        if fig_save_name:
+            save_figure(fig, fig_save_name, fig_save_format)
+        # Show figure in IDE
+        if is_show:
+            from matplotlib import pyplot as plt
+            plt.show(block=True)
+
 
 class ExportArray:
     def __init__(self):
         pass
-    @ staticmethod
-    def export_to_csv(value, file_name):
-        np.savetxt(file_name, value, delimiter=',', fmt='%s')
+
+    @staticmethod
+    @profiled()
+    def export_to_csv(value, file_name, fmt=None, chunk_rows=100000, header=None):
+        """
+            write an array as csv in chunks of rows
+        :param value: array (rows,) or (rows, columns), or ChannelSet written as x, channels
+        :param file_name: path of the csv file
+        :param fmt: numeric format or list of the formats of the columns, default '%s' as before (the shortest
+        round-trip repr of float64) and '%.9g' for float32 columns, per column for a ChannelSet, see csv_format
+        :param chunk_rows: rows formatted at a time
+        :param header: list of column names, None for no header line (x and channel names for a ChannelSet)
+        :return: None
+        """
+        if isinstance(value, ChannelSet):
+            header = [value.x_name] + value.names if header is None else header
+            formats = fmt or csv_format(value.x, value.data)
+            with open(file_name, 'w') as f:
+                f.write(','.join(str(name) for name in header) + '\n')
+                for start in range(0, value.n_samples, chunk_rows):
+                    block = np.column_stack([value.x[start: start + chunk_rows], value.data[start: start + chunk_rows]])
+                    _write_csv_rows(f, block, formats, chunk_rows)
+            return
+        value = np.asarray(value)
+        if value.dtype.kind not in 'biuf':
+            np.savetxt(file_name, value, delimiter=',', fmt='%s')
+            return
+        value = value.reshape(len(value), -1)
+        with open(file_name, 'w') as f:
+            if header is not None:
+                f.write(','.join(str(name) for name in header) + '\n')
+            _write_csv_rows(f, value, fmt or _float_format(value.dtype), chunk_rows)
+
+    @staticmethod
+    def export_to_npy(value, file_name):
+        np.save(file_name, np.asarray(value))
+
+
+EXPORT_FORMATS = ('csv', 'npy', 'npz', 'h5', 'hdf5', 'parquet')
+
+
+@profiled()
+def export_lines(lines, path, fmt=None, chunk_rows=100000, float_format=None):
+    """
+        Export lines to csv, npy, npz, hdf5 or parquet
+    An x axis shared by all lines (the same array or equal values) is written once as the first column, otherwise
+    every line keeps its own x column. Lines of different lengths are written as they are to npz/hdf5, padded with
+    nan in csv and with nulls in parquet. csv and parquet are written in chunks of rows.
+    h5py (hdf5) and pyarrow (parquet) are only imported for those formats.
+    :param lines: Line, ChannelSet, list of Line or nested lists of Line (Export2D.line_array)
+    :param path: output file
+    :param fmt: one of EXPORT_FORMATS, default the extension of path
+    :param chunk_rows: rows per chunk
+    :param float_format: csv number format, default '%.9g' for float32 and '%s' otherwise, see csv_format
+    :return: list of the column names written
+    """
+    names, arrays = _line_columns(list(_flatten_lines(lines)))
+    fmt = (fmt or os.path.splitext(path)[1][1:]).lower()
+    if fmt == 'csv':
+        _write_csv(path, names, arrays, chunk_rows, float_format)
+    elif fmt == 'npy':
+        _write_npy(path, names, arrays, chunk_rows)
+    elif fmt == 'npz':
+        np.savez(path, **dict(zip(names, arrays)))
+    elif fmt in ('h5', 'hdf5'):
+        _write_hdf5(path, names, arrays, chunk_rows)
+    elif fmt == 'parquet':
+        _write_parquet(path, names, arrays, chunk_rows)
+    else:
+        raise ValueError(f'unknown export format {fmt}, choose from {EXPORT_FORMATS}')
+    return names
+
+
+def _flatten_lines(lines):
+    if isinstance(lines, Line):
+        yield lines
+    elif isinstance(lines, ChannelSet):
+        yield from lines.lines()
+    else:
+        for item in lines:
+            yield from _flatten_lines(item)
+
+
+def _line_columns(lines):
+    """
+    :return: names, arrays with a single x column when all lines share x
+    """
+    x0 = np.asarray(lines[0].x)
+    shared = all(line.x is lines[0].x or (len(line.x) == len(x0) and np.array_equal(line.x, x0)) for line in lines)
+    if shared:
+        names = [lines[0].x_name or 'x'] + [line.y_name or f'y{i}' for i, line in enumerate(lines)]
+        arrays = [x0] + [np.asarray(line.y) for line in lines]
+    else:
+        names = []
+        arrays = []
+        for i, line in enumerate(lines):
+            names += [line.x_name or f'x{i}', line.y_name or f'y{i}']
+            arrays += [np.asarray(line.x), np.asarray(line.y)]
+    # unique names: time, time_1, time_2 ...
+    unique = []
+    for name in names:
+        candidate, k = str(name), 0
+        while candidate in unique:
+            k += 1
+            candidate = f'{name}_{k}'
+        unique.append(candidate)
+    return unique, arrays
+
+
+def _float_format(dtype):
+    # '%s' of a python float is its shortest round-trip repr, the output of the former np.savetxt(fmt='%s');
+    # float32 values become python floats in _write_csv_rows, '%.9g' keeps them short and exact
+    return '%.9g' if dtype == np.float32 else '%s'
+
+
+def csv_format(*arrays):
+    """
+        round-trip format of every column, for arrays stacked side by side, e.g. float64 time and float32 channels
+    :param arrays: (rows,) or (rows, columns) arrays
+    :return: list of formats, one per column
+    """
+    formats = []
+    for arr in arrays:
+        arr = np.asarray(arr)
+        formats += [_float_format(np.result_type(np.float32, arr))] * (arr.shape[1] if arr.ndim > 1 else 1)
+    return formats
+
+
+def _write_csv_rows(f, value, fmt, chunk_rows):
+    """
+        one % formatting per chunk of rows, identical to np.savetxt with the same fmt
+    :param fmt: format of every column, or list of the formats of the columns
+    """
+    row = ','.join([fmt] * value.shape[1] if isinstance(fmt, str) else fmt) + '\n'
+    for start in range(0, len(value), chunk_rows):
+        chunk = value[start: start + chunk_rows]
+        f.write((row * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def _padded_chunks(arrays, chunk_rows, dtype):
+    """
+        (start, rows x columns block), columns shorter than the longest one are padded with nan
+    """
+    n = max(len(arr) for arr in arrays)
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        block = np.full((stop - start, len(arrays)), np.nan, dtype=dtype)
+        for j, arr in enumerate(arrays):
+            part = arr[start: stop]
+            block[:len(part), j] = part
+        yield start, block
+
+
+def _write_csv(path, names, arrays, chunk_rows, float_format):
+    dtype = np.result_type(np.float32, *arrays)
+    formats = float_format or csv_format(*arrays)
+    with open(path, 'w') as f:
+        f.write(','.join(names) + '\n')
+        for _, block in _padded_chunks(arrays, chunk_rows, dtype):
+            _write_csv_rows(f, block, formats, chunk_rows)
+
+
+def _write_npy(path, names, arrays, chunk_rows):
+    """
+        one (rows, columns) array, the column names are not stored, use npz to keep them
+    """
+    if len({len(arr) for arr in arrays}) > 1:
+        raise ValueError('lines of different lengths cannot be written to npy, use npz, hdf5 or parquet')
+    dtype = np.result_type(*arrays)
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(len(arrays[0]), len(arrays)))
+    for start in range(0, len(arrays[0]), chunk_rows):
+        for j, arr in enumerate(arrays):
+            out[start: start + chunk_rows, j] = arr[start: start + chunk_rows]
+    out.flush()
+    del out
+
+
+def _write_hdf5(path, names, arrays, chunk_rows):
+    import h5py
+    with h5py.File(path, 'w') as f:
+        for name, arr in zip(names, arrays):
+            f.create_dataset(name, data=arr, chunks=(max(1, min(chunk_rows, len(arr))),))
+
+
+def _write_parquet(path, names, arrays, chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    n = max(len(arr) for arr in arrays)
+    schema = pa.schema([(name, pa.from_numpy_dtype(arr.dtype)) for name, arr in zip(names, arrays)])
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, n, chunk_rows):
+            stop = min(start + chunk_rows, n)
+            columns = []
+            for arr in arrays:
+                part = arr[start: stop]
+                if len(part) < stop - start:
+                    mask = np.arange(start, stop) >= len(arr)
+                    part = np.concatenate([part, np.zeros(stop - start - len(part), dtype=arr.dtype)])
+                    columns.append(pa.array(part, mask=mask))
+                else:
+                    columns.append(pa.array(part))
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+
 
 if __name__ == '__main__':
     # TEST
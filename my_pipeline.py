@@ -0,0 +1,291 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+"""
+    Batch processing of a test campaign directory
+A campaign is processed by a declarative list of stages, applied to every .rpt/.csv run in the directory:
+    stages = [{'stage': 'read'},
+              {'stage': 'filter', 'btype': 'low', 'cutoff': 30},
+              {'stage': 'dft'},
+              {'stage': 'smooth', 'bandwidth': 0.5},
+              {'stage': 'export'}]
+    run_pipeline('D:/campaign', stages, output_dir='D:/campaign/out', max_workers=8)
+or from the command line
+    python my_pipeline.py D:/campaign --stages stages.json --output D:/campaign/out --workers 8
+Runs are spread over a process pool. manifest.json in the output folder records the content hash of every run and
+of the stage list, so a second call only recomputes new or modified runs.
+With profile=True (--profile) every stage and instrumented function of the workers is timed, see my_profile, and the
+records are written to profile_trace.json in the output folder.
+"""
+
+import argparse
+import functools
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import my_profile
+from my_channels import ChannelSet
+from my_output import Export2D, ExportArray
+from my_rpt import csv_reader, rpt_reader
+from my_signal import Motion, smooth_spectrum
+
+
+DEFAULT_STAGES = [{'stage': 'read'},
+                  {'stage': 'filter'},
+                  {'stage': 'dft'},
+                  {'stage': 'smooth', 'bandwidth': 0.5},
+                  {'stage': 'export'}]
+
+
+def _stage_read(state, header=None, usecols=None, index_col=None, drop_labels=(), dtype='float64'):
+    """
+        first column: time, other columns: channels
+        dtype: 'float32' to read and process the channels in single precision, time stays float64
+    """
+    if state['path'].lower().endswith('.csv'):
+        data_df = csv_reader(state['path'], header=0 if header is None else header, index_col=index_col,
+                             drop_labels=list(drop_labels), dtype=dtype)
+    else:
+        data_df = rpt_reader(state['path'], header=1 if header is None else header, usecols=usecols, dtype=dtype)
+    channels = ChannelSet.from_dataframe(data_df)
+    state['columns'] = channels.names
+    state['motion'] = Motion(channels)
+    return state
+
+
+def _stage_filter(state, btype='low', cutoff=None, order=4, zero_phase=True):
+    """
+        cutoff: default 60 Hz, lowered to 0.4 fs for runs sampled below 150 Hz
+        a cutoff at or above the Nyquist frequency of the run raises ValueError
+    """
+    motion = state['motion']
+    nyquist = motion.fs / 2
+    if cutoff is None:
+        cutoff = min(60., 0.8 * nyquist)
+    if np.max(cutoff) >= nyquist:
+        raise ValueError(f'cutoff {cutoff} Hz is not below the Nyquist frequency {nyquist:g} Hz of the run')
+    filtered = Motion(motion.time, motion.filter(btype=btype, cutoff=cutoff, order=order, zero_phase=zero_phase))
+    filtered.names = motion.names
+    state['motion'] = filtered
+    return state
+
+
+def _stage_resample(state, fs=None, q=None):
+    """
+        fs: new sampling frequency, or q: decimation factor
+    """
+    state['motion'] = state['motion'].resample(fs) if fs is not None else state['motion'].decimate(q)
+    return state
+
+
+def _stage_dft(state, fast_length=False):
+    state['spectrum'] = state['motion'].dft(quantities=('frequency', 'amplitude'), fast_length=fast_length)
+    return state
+
+
+def _stage_smooth(state, bandwidth=0.5, window='hanning'):
+    spectrum = state['spectrum']
+    spectrum['amplitude'] = smooth_spectrum(spectrum['frequency'], spectrum['amplitude'], bandwidth, window=window)
+    return state
+
+
+def _stage_export(state, motion=True, spectrum=True, plot=False, fig_save_format=('png',)):
+    """
+        <run>_motion.csv: time, channels, with a header line of the column names
+        <run>_spectrum.csv: frequency, amplitude of the channels, with a header line
+        <run>_spectrum.<fmt>: spectrum plot with plot=True
+    """
+    base = os.path.join(state['output_dir'], state['name'])
+    if motion:
+        ExportArray.export_to_csv(ChannelSet(state['motion'].time, state['motion'].motion, state['motion'].names,
+                                             x_name='Time'), f'{base}_motion.csv')
+        state['outputs'].append(f'{base}_motion.csv')
+    if spectrum and 'spectrum' in state:
+        frequency, amplitude = state['spectrum']['frequency'], state['spectrum']['amplitude']
+        spectra = ChannelSet(frequency, amplitude, state['motion'].names, x_name='Frequency', x_unit='Hz')
+        ExportArray.export_to_csv(spectra, f'{base}_spectrum.csv')
+        state['outputs'].append(f'{base}_spectrum.csv')
+        if plot:
+            Export2D(spectra).plot_single(is_show=False, fig_save_name=f'{base}_spectrum',
+                                          fig_save_format=fig_save_format, x_label='Frequency (Hz)',
+                                          y_label='Amplitude')
+            state['outputs'] += [f'{base}_spectrum.{fmt}' for fmt in fig_save_format]
+    return state
+
+
+STAGES = {'read': _stage_read,
+          'filter': _stage_filter,
+          'resample': _stage_resample,
+          'dft': _stage_dft,
+          'smooth': _stage_smooth,
+          'export': _stage_export}
+
+
+def process_run(path, stages, output_dir):
+    """
+        apply the stages to one run
+    :param path: .rpt/.csv file
+    :param stages: list of {'stage': name, **options}
+    :param output_dir: folder of the exported files
+    :return: list of the written files
+    """
+    state = {'path': path, 'name': os.path.splitext(os.path.basename(path))[0], 'output_dir': output_dir,
+             'outputs': []}
+    for stage in stages:
+        options = dict(stage)
+        name = options.pop('stage')
+        with my_profile.profile_block(f'stage.{name}'):
+            state = STAGES[name](state, **options)
+    return state['outputs']
+
+
+def _profiled_run(path, stages, output_dir, memory=False):
+    """
+        process_run with profiling enabled in the worker
+    :return: outputs, profile records
+    """
+    my_profile.reset()
+    my_profile.enable(memory=memory)
+    try:
+        with my_profile.profile_block(f'run.{os.path.basename(path)}'):
+            outputs = process_run(path, stages, output_dir)
+    finally:
+        my_profile.disable()
+    return outputs, my_profile.records()
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    :return: sha256 of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def run_pipeline(directory, stages=None, output_dir=None, patterns=('*.rpt', '*.csv'), max_workers=None,
+                 force=False, manifest_name='manifest.json', profile=False):
+    """
+        process every run of a campaign directory, skipping runs unchanged since the last call
+    :param directory: folder of the .rpt/.csv runs
+    :param stages: list of {'stage': name, **options}, names in STAGES, default DEFAULT_STAGES
+    :param output_dir: folder of the exported files and of the manifest, default <directory>/output
+    :param patterns: glob patterns of the runs in directory
+    :param max_workers: number of processes, None for the number of cores, 0 to run in this process
+    :param force: recompute every run
+    :param manifest_name: file name of the manifest in output_dir
+    :param profile: time every stage of the processed runs, 'memory' to record the peak memory as well
+    :return: dictionary
+    processed: runs computed by this call
+    skipped: unchanged runs
+    failed: {run: error message}
+    profile: my_profile.summarize table of the processed runs, with profile only
+    """
+    stages = DEFAULT_STAGES if stages is None else stages
+    unknown = [stage['stage'] for stage in stages if stage['stage'] not in STAGES]
+    if unknown:
+        raise ValueError(f'unknown stages {unknown}, choose from {list(STAGES)}')
+    output_dir = os.path.join(directory, 'output') if output_dir is None else output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, manifest_name)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    stages_hash = hashlib.sha256(json.dumps(stages, sort_keys=True).encode('utf-8')).hexdigest()
+
+    paths = sorted({path for pattern in patterns for path in glob.glob(os.path.join(directory, pattern))})
+    summary = {'processed': [], 'skipped': [], 'failed': {}}
+    pending = {}
+    for path in paths:
+        name = os.path.basename(path)
+        content_hash = file_hash(path)
+        entry = manifest.get(name, {})
+        if not force and entry.get('hash') == content_hash and entry.get('stages') == stages_hash and \
+                all(os.path.exists(output) for output in entry.get('outputs', [])):
+            summary['skipped'].append(name)
+        else:
+            pending[name] = (path, content_hash)
+
+    profile_records = []
+    if profile:
+        job = functools.partial(_profiled_run, memory=profile == 'memory')
+    else:
+        job = process_run
+
+    def done(name, result):
+        if profile:
+            result, run_records = result
+            profile_records.extend(run_records)
+        outputs = result
+        manifest[name] = {'hash': pending[name][1], 'stages': stages_hash, 'outputs': outputs}
+        summary['processed'].append(name)
+        _write_json(manifest_path, manifest)
+
+    if max_workers == 0:
+        for name, (path, _) in pending.items():
+            try:
+                done(name, job(path, stages, output_dir))
+            except Exception as error:
+                summary['failed'][name] = repr(error)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(job, path, stages, output_dir): name
+                       for name, (path, _) in pending.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    done(name, future.result())
+                except Exception as error:
+                    summary['failed'][name] = repr(error)
+    if profile:
+        my_profile.dump_chrome_trace(os.path.join(output_dir, 'profile_trace.json'), profile_records)
+        summary['profile'] = my_profile.summarize(profile_records)
+    return summary
+
+
+def _write_json(path, obj):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(obj, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Process every .rpt/.csv run of a shaking table test campaign.')
+    parser.add_argument('directory', help='folder of the .rpt/.csv runs')
+    parser.add_argument('--stages', help='json file with the list of stages, default read-filter-dft-smooth-export')
+    parser.add_argument('--output', help='folder of the exported files and manifest, default <directory>/output')
+    parser.add_argument('--pattern', action='append', help='glob pattern of the runs, repeatable')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, 0 for no pool')
+    parser.add_argument('--force', action='store_true', help='recompute unchanged runs')
+    parser.add_argument('--profile', nargs='?', const=True, default=False, choices=[True, 'memory'],
+                        help='time every stage, --profile memory also records the peak memory')
+    args = parser.parse_args(argv)
+    stages = None
+    if args.stages:
+        with open(args.stages, 'r') as f:
+            stages = json.load(f)
+    summary = run_pipeline(args.directory, stages, output_dir=args.output,
+                           patterns=tuple(args.pattern) if args.pattern else ('*.rpt', '*.csv'),
+                           max_workers=args.workers, force=args.force, profile=args.profile)
+    print(f"processed {len(summary['processed'])}, skipped {len(summary['skipped'])}, "
+          f"failed {len(summary['failed'])}")
+    for name, error in summary['failed'].items():
+        print(f'  {name}: {error}')
+    if args.profile:
+        my_profile.print_summary(summary['profile'])
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,229 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+"""
+    Instrumentation of the reader, signal and export functions
+Profiling is off by default. A decorated function then costs one flag check per call.
+    import my_profile
+    my_profile.enable(memory=True)
+    data_df = rpt_reader('run01.rpt')
+    spectrum = Motion(...).dft()
+    my_profile.summary()                        # table per function, sorted by total wall time
+    my_profile.dump_chrome_trace('trace.json')  # open in chrome://tracing or https://ui.perfetto.dev
+Every call records wall time, CPU time of the process, the bytes of the array arguments and results, and with
+memory=True the peak of the memory allocated during the call (tracemalloc, which slows numpy-light code).
+Own code is timed with the same records by
+    @profiled('my_step')
+    def my_step(...): ...
+or
+    with profile_block('my_step'):
+        ...
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_ENABLED = False
+_MEMORY = False
+_RECORDS = []
+_LOCAL = threading.local()
+
+
+def enable(memory=False):
+    """
+    :param memory: also record the peak allocated memory of every call with tracemalloc
+    """
+    global _ENABLED, _MEMORY
+    _MEMORY = memory
+    if memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    _ENABLED = True
+
+
+def disable():
+    """
+        stop recording, the records are kept until reset
+    """
+    global _ENABLED, _MEMORY
+    if _MEMORY:
+        import tracemalloc
+        tracemalloc.stop()
+    _ENABLED = False
+    _MEMORY = False
+
+
+def is_enabled():
+    return _ENABLED
+
+
+def reset():
+    """
+        forget the records
+    """
+    del _RECORDS[:]
+
+
+def records():
+    """
+    :return: list of dictionaries
+    name, start (s, perf_counter), wall (s), cpu (s), peak (bytes or None), in_bytes, out_bytes, pid, tid
+    """
+    return list(_RECORDS)
+
+
+def add_records(new_records):
+    """
+        merge records of another process, e.g. returned by a worker of a process pool
+    """
+    _RECORDS.extend(new_records)
+
+
+def nbytes(obj):
+    """
+    :return: bytes of the arrays in obj, 0 for other objects
+    ndarray, DataFrame, ChannelSet, Line, Motion and dict/list/tuple of them are counted
+    """
+    size = getattr(obj, 'nbytes', None)
+    if isinstance(size, int):
+        return size
+    if isinstance(obj, dict):
+        return sum(nbytes(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(value) for value in obj)
+    if hasattr(obj, 'memory_usage') and hasattr(obj, 'columns'):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    if hasattr(obj, 'data') and hasattr(obj, 'x'):
+        return nbytes(obj.x) + nbytes(obj.data)
+    if hasattr(obj, 'time') and hasattr(obj, 'motion'):
+        return nbytes(obj.time) + nbytes(obj.motion)
+    if hasattr(obj, 'x') and hasattr(obj, 'y'):
+        return nbytes(obj.x) + nbytes(obj.y)
+    return 0
+
+
+def profiled(name=None):
+    """
+        decorator recording every call of the function while profiling is enabled
+    :param name: name of the records, default module.qualname of the function
+    """
+    def decorator(func):
+        label = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return func(*args, **kwargs)
+            with profile_block(label, args, kwargs) as record:
+                result = func(*args, **kwargs)
+                record['out_bytes'] = nbytes(result)
+            return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile_block(name, *arrays):
+    """
+        record the block while profiling is enabled
+    :param name: name of the record
+    :param arrays: inputs counted in in_bytes
+    :return: the record dictionary, out_bytes may be set inside the block
+    """
+    if not _ENABLED:
+        yield {}
+        return
+    stack = getattr(_LOCAL, 'stack', None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    record = {'name': name, 'in_bytes': nbytes(arrays), 'out_bytes': 0, 'peak': None,
+              'pid': os.getpid(), 'tid': threading.get_ident()}
+    memory = _MEMORY
+    if memory:
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # the peak of the enclosing block so far, before the counter is reset for this block
+            stack[-1] = max(stack[-1], peak)
+        tracemalloc.reset_peak()
+        stack.append(0)
+    start = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall'] = time.perf_counter() - start
+        record['cpu'] = time.process_time() - cpu
+        record['start'] = start
+        if memory:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, stack.pop())
+            record['peak'] = peak - current
+            if stack:
+                stack[-1] = max(stack[-1], peak)
+        _RECORDS.append(record)
+
+
+def summarize(records_list=None):
+    """
+    :return: list of dictionaries per name, sorted by total wall time
+    name, calls, wall, cpu, mean, peak (max), in_bytes, out_bytes (sums)
+    """
+    table = {}
+    for record in _RECORDS if records_list is None else records_list:
+        row = table.setdefault(record['name'], {'name': record['name'], 'calls': 0, 'wall': 0., 'cpu': 0.,
+                                                'peak': None, 'in_bytes': 0, 'out_bytes': 0})
+        row['calls'] += 1
+        row['wall'] += record['wall']
+        row['cpu'] += record['cpu']
+        row['in_bytes'] += record['in_bytes']
+        row['out_bytes'] += record['out_bytes']
+        if record['peak'] is not None:
+            row['peak'] = max(row['peak'] or 0, record['peak'])
+    for row in table.values():
+        row['mean'] = row['wall'] / row['calls']
+    return sorted(table.values(), key=lambda row: row['wall'], reverse=True)
+
+
+def summary(records_list=None, file=None):
+    """
+        print the per-function table, the time of a nested call is also part of its caller
+    """
+    print_summary(summarize(records_list), file=file)
+
+
+def print_summary(rows, file=None):
+    """
+    :param rows: table of summarize
+    """
+    file = sys.stdout if file is None else file
+    print(f"{'name':<40s} {'calls':>6s} {'wall s':>9s} {'cpu s':>9s} {'mean ms':>9s} {'peak MB':>8s} "
+          f"{'in MB':>8s} {'out MB':>8s}", file=file)
+    for row in rows:
+        peak = '-' if row['peak'] is None else f"{row['peak'] / 2 ** 20:.1f}"
+        print(f"{row['name']:<40s} {row['calls']:6d} {row['wall']:9.3f} {row['cpu']:9.3f} {row['mean'] * 1e3:9.2f} "
+              f"{peak:>8s} {row['in_bytes'] / 2 ** 20:8.1f} {row['out_bytes'] / 2 ** 20:8.1f}", file=file)
+
+
+def dump_chrome_trace(path, records_list=None):
+    """
+        Chrome trace event json (complete events), viewed in chrome://tracing or Perfetto
+    """
+    records_list = _RECORDS if records_list is None else records_list
+    origin = min((record['start'] for record in records_list), default=0.)
+    events = [{'name': record['name'], 'ph': 'X', 'ts': (record['start'] - origin) * 1e6,
+               'dur': record['wall'] * 1e6, 'pid': record['pid'], 'tid': record['tid'],
+               'args': {'cpu': record['cpu'], 'peak': record['peak'], 'in_bytes': record['in_bytes'],
+                        'out_bytes': record['out_bytes']}}
+              for record in records_list]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
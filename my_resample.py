@@ -0,0 +1,202 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+"""
+    Anti-aliased polyphase resampling of (samples × channels) records
+Records are resampled by up / down with one FIR low-pass applied in the polyphase form (scipy.signal.resample_poly),
+all channels in one call. The FIR design depends only on (up, down, window) and is cached.
+    data_50 = resample(data_200, 1, 4)                      # 200 Hz -> 50 Hz
+    up, down = resample_ratio(200, 256)                     # 200 Hz -> 256 Hz, (32, 25)
+    motion = align([accelerometers, lvdts, load_cells], fs=200)   # mixed-rate sensors on one time base
+StreamingResampler gives the same samples block by block, e.g. to decimate a long record read with
+my_rpt.rpt_chunk_reader before the spectral analysis.
+"""
+
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+
+from my_profile import profiled
+
+
+def resample_ratio(fs_in, fs_out, max_denominator=1000):
+    """
+    :return: up, down with fs_in * up / down == fs_out, the smallest integers within max_denominator
+    """
+    ratio = Fraction(fs_out / fs_in).limit_denominator(max_denominator)
+    return ratio.numerator, ratio.denominator
+
+
+def polyphase_fir(up, down, window=('kaiser', 5.0)):
+    """
+        low-pass FIR of resample_poly for up / down, cached on (up, down, window)
+    The gain up of the interpolation is not included, resample_poly applies it.
+    :param up: upsampling factor
+    :param down: downsampling factor
+    :param window: window of the FIR design, see scipy.signal.firwin
+    :return: ndarray, shared between calls, do not modify it
+    """
+    g = np.gcd(int(up), int(down))
+    return _polyphase_fir(int(up) // g, int(down) // g, window)
+
+
+@lru_cache(maxsize=64)
+def _polyphase_fir(up, down, window):
+    from scipy.signal import firwin
+    # the design of scipy.signal.resample_poly: cutoff at the lower of the two Nyquist frequencies
+    max_rate = max(up, down)
+    if max_rate == 1:
+        return np.ones(1)
+    half_len = 10 * max_rate
+    return firwin(2 * half_len + 1, 1. / max_rate, window=window)
+
+
+@profiled()
+def resample(data, up, down, window=('kaiser', 5.0), axis=0):
+    """
+        polyphase resampling by up / down of every channel in one call
+    :param data: ndarray (samples,) or (samples, channels)
+    :param up: upsampling factor
+    :param down: downsampling factor
+    :param window: window of the FIR design, see polyphase_fir
+    :param axis: time axis of data
+    :return: ndarray with ceil(samples * up / down) samples along axis
+    """
+    from scipy.signal import resample_poly
+    g = np.gcd(int(up), int(down))
+    up, down = int(up) // g, int(down) // g
+    if up == down == 1:
+        return np.array(data)
+    data = np.asarray(data)
+    # float32 coefficients keep float32 records in float32, the quantization is far below the stopband
+    return resample_poly(data, up, down, axis=axis, window=polyphase_fir(up, down, window).astype(_real_dtype(data)))
+
+
+def _real_dtype(data):
+    return np.finfo(np.result_type(data.dtype, np.float32)).dtype
+
+
+def decimate(data, q, window=('kaiser', 5.0), axis=0):
+    """
+        anti-aliased downsampling by the integer factor q, resample(data, 1, q)
+    """
+    return resample(data, 1, q, window=window, axis=axis)
+
+
+class StreamingResampler:
+    """
+        Polyphase resampling of blocks of a record along axis 0
+    Output sample m of resample_poly is the filtered upsampled record at m * down + half_len, so it is emitted as
+    soon as the input that it depends on has been pushed. The concatenation of every push and of flush equals
+    resample(record, up, down) of the whole record, and only about len(fir) / up input samples are kept.
+    resampler = StreamingResampler(1, 4)
+    for time, data, columns in rpt_chunk_reader('run01.rpt'):
+        blocks.append(resampler.push(data))
+    blocks.append(resampler.flush())
+    """
+
+    def __init__(self, up, down, window=('kaiser', 5.0)):
+        """
+        :param up: upsampling factor
+        :param down: downsampling factor
+        :param window: window of the FIR design, see polyphase_fir
+        """
+        g = np.gcd(int(up), int(down))
+        self.up, self.down = int(up) // g, int(down) // g
+        self.fir = polyphase_fir(self.up, self.down, window) * self.up
+        self.half_len = (len(self.fir) - 1) // 2
+        self.reset()
+
+    def reset(self):
+        """
+            forget the pushed blocks
+        """
+        self._buffer = None
+        # absolute index of the first buffered input sample, input samples received, next output sample
+        self._start = 0
+        self._received = 0
+        self._next = 0
+
+    def push(self, block):
+        """
+        :param block: ndarray (samples,) or (samples, channels), the channel count must not change between calls
+        :return: output samples that are complete after this block, (outputs,) or (outputs, channels)
+        """
+        block = np.asarray(block)
+        self._buffer = block if self._buffer is None else np.concatenate([self._buffer, block], axis=0)
+        self._received += block.shape[0]
+        # the upsampled record is known up to index received * up - 1
+        last = (self._received * self.up - 1 - self.half_len) // self.down
+        return self._emit(last + 1)
+
+    def flush(self):
+        """
+            the remaining output samples, with zeros after the end of the record as in resample_poly
+        :return: (outputs,) or (outputs, channels)
+        """
+        if self._buffer is None:
+            return np.empty(0)
+        n_out = -(-self._received * self.up // self.down)
+        n_zeros = len(self.fir) // self.up + 2
+        self._buffer = np.concatenate([self._buffer, np.zeros((n_zeros,) + self._buffer.shape[1:],
+                                                              dtype=self._buffer.dtype)], axis=0)
+        out = self._emit(n_out)
+        self.reset()
+        return out
+
+    def _emit(self, stop):
+        from scipy.signal import upfirdn
+        n = max(stop - self._next, 0)
+        if n == 0:
+            return np.empty((0,) + self._buffer.shape[1:], dtype=np.result_type(self._buffer.dtype, np.float32))
+        # position in the upsampled record of the first output, relative to the first buffered sample
+        first = self._next * self.down + self.half_len - self._start * self.up
+        # leading zeros shift the filter so that the first output falls on a multiple of down
+        shift = (-first) % self.down
+        fir = np.concatenate([np.zeros(shift), self.fir]) if shift else self.fir
+        fir = fir.astype(_real_dtype(self._buffer), copy=False)
+        offset = (first + shift) // self.down
+        out = upfirdn(fir, self._buffer, self.up, self.down, axis=0)[offset: offset + n]
+        self._next = stop
+        # drop the input samples that no later output depends on
+        keep = max(0, -(-(self._next * self.down + self.half_len - (len(self.fir) - 1)) // self.up))
+        if keep > self._start:
+            self._buffer = self._buffer[keep - self._start:]
+            self._start = keep
+        return out
+
+
+def align(records, fs=None, window=('kaiser', 5.0), max_denominator=1000):
+    """
+        resample records of different rates to fs and join their channels on the common time span
+    The time bases are matched to the nearest output sample, start offsets below 1 / (2 fs) are not interpolated.
+    :param records: Motion objects, e.g. accelerometers at 200 Hz, LVDTs at 50 Hz and load cells at 1000 Hz
+    :param fs: common sampling frequency, default the highest rate of the records
+    :param window: window of the FIR design, see polyphase_fir
+    :param max_denominator: see resample_ratio
+    :return: ChannelSet, names of a record without channel names are r<record>.ch<channel>
+    """
+    from my_channels import ChannelSet
+    fs = max(record.fs for record in records) if fs is None else fs
+    blocks = []
+    for record in records:
+        up, down = resample_ratio(record.fs, fs, max_denominator)
+        data = np.asarray(record.motion)
+        data = resample(data.reshape(len(data), -1), up, down, window=window)
+        blocks.append((record.time[0], data))
+    start = max(t0 for t0, _ in blocks)
+    offsets = [int(round((start - t0) * fs)) for t0, _ in blocks]
+    # upsampling adds samples after the last one of a record, they are not kept
+    n = min(min(len(data) - offset, int(np.floor((record.time[-1] - start) * fs + 1e-6)) + 1)
+            for record, (_, data), offset in zip(records, blocks, offsets))
+    if n < 1:
+        raise ValueError('the records do not overlap in time')
+    columns, names = [], []
+    for i, (record, (_, data), offset) in enumerate(zip(records, blocks, offsets)):
+        columns.append(data[offset: offset + n])
+        names += record.names if record.names is not None else [f'r{i}.ch{j}' for j in range(data.shape[1])]
+    return ChannelSet(start + np.arange(n) / fs, np.concatenate(columns, axis=1), names)
@@ -0,0 +1,138 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+import numpy as np
+
+from my_channels import sample_interval
+from my_profile import profiled
+
+
+DEFAULT_PERIODS = np.concatenate([np.arange(0.01, 0.1, 0.01), np.arange(0.1, 1., 0.02), np.arange(1., 6.01, 0.1)])
+
+
+@profiled()
+def response_spectrum(time, acc, periods=None, damping=0.05):
+    """
+        Elastic response spectra of SDOF oscillators x'' + 2ξωx' + ω²x = -acc
+    The ground acceleration is taken as piecewise linear between samples and the oscillators are advanced with the
+    exact recurrence of Nigam & Jennings (1969). Every period, damping ratio and channel is one element of the state
+    arrays, so a time step is a handful of array operations whatever the number of oscillators.
+    references:
+    1. Nigam N.C., Jennings P.C. Calculation of response spectra from strong-motion earthquake records. BSSA, 1969.
+    :param time: numpy.ndarray (samples,), equally spaced, dt averaged over the record, see sample_interval
+    :param acc: numpy.ndarray (samples,) or (samples, channels), ground acceleration
+    :param periods: natural periods (s), > 0, default DEFAULT_PERIODS
+    :param damping: damping ratio, scalar or array (< 1)
+    :return: dictionary
+    period (periods,)
+    damping (dampings,)
+    Sd peak relative displacement, shape (periods, [dampings,] [channels]), the damping axis only for array damping
+    Sv pseudo velocity ω*Sd
+    Sa pseudo acceleration ω²*Sd
+    """
+    dt = sample_interval(time)
+    acc = np.asarray(acc, dtype=float)
+    periods = DEFAULT_PERIODS if periods is None else np.asarray(periods, dtype=float)
+    damping_array = np.atleast_1d(np.asarray(damping, dtype=float))
+    # oscillator axes (periods, dampings) followed by the channel axes of acc
+    shape = (len(periods), len(damping_array)) + (1,) * (acc.ndim - 1)
+    omega = (2 * np.pi / periods).reshape((-1, 1))
+    xi = damping_array.reshape((1, -1))
+    a11, a12, a21, a22, b11, b12, b21, b22 = (c.reshape(shape) for c in _nigam_jennings(omega, xi, dt))
+
+    state_shape = shape[:2] + acc.shape[1:]
+    u = np.zeros(state_shape)
+    v = np.zeros(state_shape)
+    u_new = np.empty(state_shape)
+    v_new = np.empty(state_shape)
+    temp = np.empty(state_shape)
+    peak = np.zeros(state_shape)
+    for i in range(acc.shape[0] - 1):
+        a_i = acc[i]
+        a_j = acc[i + 1]
+        # u_new = a11 * u + a12 * v + b11 * a_i + b12 * a_j
+        np.multiply(a11, u, out=u_new)
+        u_new += np.multiply(a12, v, out=temp)
+        u_new += np.multiply(b11, a_i, out=temp)
+        u_new += np.multiply(b12, a_j, out=temp)
+        # v_new = a21 * u + a22 * v + b21 * a_i + b22 * a_j
+        np.multiply(a21, u, out=v_new)
+        v_new += np.multiply(a22, v, out=temp)
+        v_new += np.multiply(b21, a_i, out=temp)
+        v_new += np.multiply(b22, a_j, out=temp)
+        u, u_new = u_new, u
+        v, v_new = v_new, v
+        np.maximum(peak, np.abs(u, out=temp), out=peak)
+
+    omega = omega.reshape((-1,) + (1,) * (len(shape) - 1))
+    spectra = {'Sd': peak, 'Sv': omega * peak, 'Sa': omega ** 2 * peak}
+    if np.ndim(damping) == 0:
+        spectra = {key: value[:, 0] for key, value in spectra.items()}
+    spectra['period'] = periods
+    spectra['damping'] = damping_array
+    return spectra
+
+
+def _nigam_jennings(omega, xi, dt):
+    """
+    :return: a11, a12, a21, a22, b11, b12, b21, b22
+    [u, v]_(i+1) = A [u, v]_i + B [acc_i, acc_(i+1)]
+    """
+    sqrt_xi = np.sqrt(1 - xi ** 2)
+    omega_d = omega * sqrt_xi
+    e = np.exp(-xi * omega * dt)
+    s = np.sin(omega_d * dt)
+    c = np.cos(omega_d * dt)
+    a11 = e * (xi / sqrt_xi * s + c)
+    a12 = e * s / omega_d
+    a21 = -omega / sqrt_xi * e * s
+    a22 = e * (c - xi / sqrt_xi * s)
+    k1 = (2 * xi ** 2 - 1) / (omega ** 2 * dt)
+    k2 = 2 * xi / (omega ** 3 * dt)
+    b11 = e * ((k1 + xi / omega) * s / omega_d + (k2 + 1 / omega ** 2) * c) - k2
+    b12 = -e * (k1 * s / omega_d + k2 * c) - 1 / omega ** 2 + k2
+    b21 = e * ((k1 + xi / omega) * (c - xi / sqrt_xi * s) - (k2 + 1 / omega ** 2) * (omega_d * s + xi * omega * c)) \
+        + 1 / (omega ** 2 * dt)
+    b22 = -e * (k1 * (c - xi / sqrt_xi * s) - k2 * (omega_d * s + xi * omega * c)) - 1 / (omega ** 2 * dt)
+    return a11, a12, a21, a22, b11, b12, b21, b22
+
+
+def spectrum_intensity(time, acc, damping=0.05, period_range=(0.1, 2.5), n_periods=121):
+    """
+        Velocity spectrum intensity VSI = ∫ Sv(T, ξ) dT over period_range (von Thun et al., 1988)
+    :param time: numpy.ndarray (samples,)
+    :param acc: numpy.ndarray (samples,) or (samples, channels)
+    :param damping: damping ratio
+    :param period_range: integration limits (s)
+    :param n_periods: periods evaluated between the limits
+    :return: float or ndarray (channels,), unit of acc × s²
+    """
+    from scipy.integrate import trapezoid
+    periods = np.linspace(period_range[0], period_range[1], n_periods)
+    spectra = response_spectrum(time, acc, periods=periods, damping=damping)
+    return trapezoid(spectra['Sv'], periods, axis=0)
+
+
+def response_spectrum_suite(records, periods=None, damping=0.05, max_workers=None):
+    """
+        response_spectrum of a ground-motion suite, one record per worker process
+    :param records: iterable of (time, acc) pairs or objects with time and motion attributes (Motion)
+    :param periods: see response_spectrum
+    :param damping: see response_spectrum
+    :param max_workers: number of processes, None for the number of cores, 0 to run in this process
+    :return: list of response_spectrum dictionaries in the order of records
+    """
+    jobs = [(record.time, record.motion, periods, damping) if hasattr(record, 'motion') else
+            (record[0], record[1], periods, damping) for record in records]
+    if max_workers == 0:
+        return [_response_spectrum_job(job) for job in jobs]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_response_spectrum_job, jobs))
+
+
+def _response_spectrum_job(job):
+    return response_spectrum(*job)
@@ -1,13 +1,29 @@
 # -*- coding:utf-8 -*-
 # Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
 # Established at:      2021/11/1 14:57
-# Modified at:         2022/5/2 12:21-
+# Modified at:         2026/10/17
 # Project:
 
-import pandas as pd
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+from time import monotonic, sleep
 
+import numpy as np
 
-def rpt_reader(fp, header=1, index_col=None, delim_whitespace=True):
+from my_channels import sample_interval
+from my_profile import profiled
+
+# pandas is imported by the functions that use it, rpt_chunk_reader runs on numpy only
+
+
+@profiled()
+def rpt_reader(fp, header=1, index_col=None, delim_whitespace=True, usecols=None, cache=None, dtype=None):
     """
     returns:
     data_df: pandas dataframe of the rpt files
@@ -15,17 +31,395 @@ def rpt_reader(fp, header=1, index_col=None, delim_whitespace=True):
     used for Abaqus 6.22 .rpt report files
     
     data_df.values
+    usecols: read only these columns (names or positions)
+    cache: ReaderCache, None for the cache set by enable_cache, False to always parse the file
+    dtype: dtype of the value columns, e.g. np.float32 parsed without a float64 copy, the first column of the file
+    (time) stays float64, None for the pandas default
+    use rpt_chunk_reader for files that do not fit in memory
     """
-    data_df = pd.read_table(fp, header=header, index_col=index_col, delim_whitespace=delim_whitespace)
+    def parse():
+        import pandas as pd
+        sep = r'\s+' if delim_whitespace else '\t'
+        return pd.read_table(fp, header=header, index_col=index_col, sep=sep, usecols=usecols,
+                             dtype=_column_dtypes(dtype))
+
+    data_df = _cached_read(cache, fp, 'rpt_reader', parse, header=header, index_col=index_col,
+                           delim_whitespace=delim_whitespace, usecols=usecols, dtype=_dtype_name(dtype))
     return data_df
 
 
-def csv_reader(fp, header, index_col, drop_labels, delimiter=',', low_memory=False):
+RptChunk = namedtuple('RptChunk', ['time', 'data', 'columns'])
+
+
+def _column_dtypes(dtype):
+    """
+        pandas dtype argument: dtype for every column except the first one of the file (time), kept in float64
+    """
+    if dtype is None:
+        return None
+    from collections import defaultdict
+    return defaultdict(lambda: np.dtype(dtype), {0: np.float64})
+
+
+def _dtype_name(dtype):
+    return None if dtype is None else np.dtype(dtype).name
+
+
+def rpt_chunk_reader(fp, chunk_size=100000, usecols=None, header=1, time_col=0, dtype=float):
+    """
+        Stream an Abaqus .rpt report in blocks of rows
+    Only one block of text and numbers is held at a time, so the size of the file is not limited by memory.
+    Blank lines are skipped and header counts non-blank lines, as in rpt_reader.
+    for time, data, columns in rpt_chunk_reader('run01.rpt', usecols=['ACC1', 'ACC2']):
+        ...
+    :param fp: path of the .rpt file
+    :param chunk_size: lines of text parsed per block
+    :param usecols: names or positions of the columns in data, None for every column except time_col
+    :param header: row number of the column names among the non-blank lines
+    :param time_col: name or position of the time column
+    :param dtype: dtype of data, parsed directly into it (float32 without a float64 copy), time is float64
+    :return: generator of RptChunk(time (rows,), data (rows, len(usecols)), columns)
+    """
+    with open(fp, 'r') as f:
+        non_blank = (line for line in f if line.strip())
+        names = next(islice(non_blank, header, None)).split()
+        time_index = _column_index(names, time_col)
+        if usecols is None:
+            data_index = [i for i in range(len(names)) if i != time_index]
+        else:
+            data_index = [_column_index(names, col) for col in usecols]
+        columns = [names[i] for i in data_index]
+        # the time column is parsed together with the data columns into one record per row, then split off
+        parse_index = [time_index] + data_index
+        row = np.dtype([('time', np.float64), ('data', dtype, (len(data_index),))])
+        while True:
+            lines = list(islice(non_blank, chunk_size))
+            if not lines:
+                break
+            block = np.loadtxt(lines, usecols=parse_index, dtype=row, ndmin=1)
+            yield RptChunk(np.ascontiguousarray(block['time']), np.ascontiguousarray(block['data']), columns)
+
+
+def _column_index(names, col):
+    if isinstance(col, (int, np.integer)):
+        return int(col)
+    return names.index(col)
+
+
+def replay_reader(fp, chunk_duration=0.1, realtime=True, speed=1., usecols=None, header=None, time_col=0,
+                  block_size=100000, dtype=float):
+    """
+        Replay a recorded .rpt/.csv file as a live DAQ feed
+    The record is read in blocks and cut into chunks of chunk_duration seconds. With realtime, a chunk is yielded
+    when its last sample would have been acquired, so code for a live feed can be tested without hardware.
+    :param fp: path of the .rpt or .csv file
+    :param chunk_duration: seconds of record per chunk
+    :param realtime: pace the chunks with the time column, False to yield them as fast as possible
+    :param speed: replay speed factor for realtime
+    :param usecols: names or positions of the data columns, None for every column except time_col
+    :param header: row number of the column names, default 1 for .rpt (non-blank lines) and 0 for .csv
+    :param time_col: name or position of the time column
+    :param block_size: rows read from the file at a time
+    :param dtype: dtype of data, time is float64
+    :return: generator of RptChunk(time, data, columns)
     """
+    if fp.lower().endswith('.csv'):
+        blocks = _csv_blocks(fp, block_size, usecols, 0 if header is None else header, time_col, dtype)
+    else:
+        blocks = rpt_chunk_reader(fp, chunk_size=block_size, usecols=usecols, header=1 if header is None else header,
+                                  time_col=time_col, dtype=dtype)
+    start = t0 = chunk_size = None
+    time_rest = data_rest = None
+    for block in blocks:
+        time_block, data_block = block.time, block.data
+        if time_rest is not None:
+            time_block = np.concatenate([time_rest, time_block])
+            data_block = np.concatenate([data_rest, data_block])
+        if chunk_size is None:
+            if len(time_block) < 2:
+                time_rest, data_rest = time_block, data_block
+                continue
+            chunk_size = max(1, int(round(chunk_duration / sample_interval(time_block))))
+            start, t0 = monotonic(), time_block[0]
+        n_full = len(time_block) // chunk_size * chunk_size
+        for i in range(0, n_full, chunk_size):
+            chunk = RptChunk(time_block[i: i + chunk_size], data_block[i: i + chunk_size], block.columns)
+            if realtime:
+                sleep(max(0., start + (chunk.time[-1] - t0) / speed - monotonic()))
+            yield chunk
+        time_rest, data_rest = time_block[n_full:], data_block[n_full:]
+    if time_rest is not None and len(time_rest):
+        yield RptChunk(time_rest, data_rest, block.columns)
 
+
+def _csv_blocks(fp, block_size, usecols, header, time_col, dtype=float):
+    import pandas as pd
+    for df in pd.read_table(fp, header=header, delimiter=',', chunksize=block_size):
+        time_index = _column_index(list(df.columns), time_col)
+        if usecols is None:
+            data_index = [i for i in range(df.shape[1]) if i != time_index]
+        else:
+            data_index = [_column_index(list(df.columns), col) for col in usecols]
+        yield RptChunk(df.iloc[:, time_index].to_numpy(dtype=float), df.iloc[:, data_index].to_numpy(dtype=dtype),
+                       [df.columns[i] for i in data_index])
+
+
+@profiled()
+def csv_reader(fp, header, index_col, drop_labels, delimiter=',', low_memory=False, cache=None, dtype=None):
+    """
+    cache: ReaderCache, None for the cache set by enable_cache, False to always parse the file
+    dtype: dtype of the value columns, the first column of the file (time) stays float64, see rpt_reader
     :return:
     """
-    data_df = pd.read_table(fp, header=header, index_col=index_col, delimiter=delimiter, low_memory=low_memory)
-    data_df = data_df.drop(labels=drop_labels)
+    def parse():
+        import pandas as pd
+        df = pd.read_table(fp, header=header, index_col=index_col, delimiter=delimiter, low_memory=low_memory,
+                           dtype=_column_dtypes(dtype))
+        return df.drop(labels=drop_labels)
+
+    data_df = _cached_read(cache, fp, 'csv_reader', parse, header=header, index_col=index_col,
+                           drop_labels=drop_labels, delimiter=delimiter, low_memory=low_memory,
+                           dtype=_dtype_name(dtype))
     # data_df.dropna(axis=0, how='any', inplace=True)
     return data_df
+
+
+LoadResult = namedtuple('LoadResult', ['index', 'path', 'data', 'error'])
+
+READERS = {'.rpt': 'rpt', '.csv': 'csv'}
+
+
+def bulk_reader(files, reader='auto', max_workers=8, processes=0, ordered=True, max_pending=None, **reader_kwargs):
+    """
+        Read many .rpt/.csv files concurrently
+    Files are read by a pool of max_workers threads, so the latency of the disk or network share overlaps. With
+    processes > 0 a process pool reads and parses instead, for campaigns where the text parsing is the bottleneck.
+    At most max_pending files are read ahead of the consumer, so a slow consumer keeps memory bounded.
+    A file that cannot be read gives a LoadResult with its error, the other files are still read.
+    for result in bulk_reader('D:/campaign/*.rpt', ordered=False):
+        if result.error is None:
+            motion = Motion(ChannelSet.from_dataframe(result.data))
+    :param files: glob pattern, or list of paths and glob patterns
+    :param reader: 'rpt', 'csv', 'auto' by file extension, or a function fp -> data (picklable with processes)
+    :param max_workers: threads, without processes
+    :param processes: worker processes, 0 for the thread pool
+    :param ordered: yield in the order of files, False to yield as the reads complete
+    :param max_pending: files submitted and not yet yielded, default 2 * workers
+    :param reader_kwargs: keyword arguments of every reader call, e.g. dtype=np.float32, default header=0,
+    index_col=None, drop_labels=() for csv_reader
+    :return: generator of LoadResult(index in files, path, data or None, exception or None)
+    """
+    paths = _expand_files(files)
+    workers = processes if processes else max_workers
+    max_pending = 2 * workers if max_pending is None else max(1, max_pending)
+    executor = ProcessPoolExecutor(processes) if processes else ThreadPoolExecutor(max_workers)
+    jobs = iter(enumerate(paths))
+    pending = deque() if ordered else set()
+    # future: (index, path)
+    submitted = {}
+
+    def submit():
+        for index, path in islice(jobs, max_pending - len(pending)):
+            future = executor.submit(_read_file, path, reader, reader_kwargs)
+            submitted[future] = index, path
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+
+    try:
+        submit()
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+                wait(done)
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                done = sorted(done, key=lambda future: submitted[future][0])
+            # the next reads start before the results are handed to the consumer
+            submit()
+            for future in done:
+                index, path = submitted.pop(future)
+                error = future.exception()
+                yield LoadResult(index, path, None if error else future.result(), error)
+    finally:
+        # the consumer stopped early or the batch is complete
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _expand_files(files):
+    if isinstance(files, (str, os.PathLike)):
+        files = [files]
+    paths = []
+    for item in files:
+        item = os.fspath(item)
+        paths += sorted(glob.glob(item)) if any(char in item for char in '*?[') else [item]
+    return paths
+
+
+def _read_file(path, reader, reader_kwargs):
+    if callable(reader):
+        return reader(path, **reader_kwargs)
+    if reader == 'auto':
+        reader = READERS.get(os.path.splitext(path)[1].lower(), 'rpt')
+    if reader == 'csv':
+        kwargs = dict({'header': 0, 'index_col': None, 'drop_labels': []}, **reader_kwargs)
+        kwargs['drop_labels'] = list(kwargs['drop_labels'])
+        return csv_reader(path, **kwargs)
+    if reader == 'rpt':
+        return rpt_reader(path, **reader_kwargs)
+    raise ValueError(f'unknown reader {reader!r}, choose from rpt, csv, auto or a function')
+
+
+class ReaderCache:
+    """
+        Parse-once binary cache of rpt_reader/csv_reader results
+    Every entry is one binary file with the columns stored one after another, plus a small json file with the
+    column names, dtypes and offsets. A hit memory-maps the binary file instead of parsing the text again.
+    The key covers path, size, mtime and the reader arguments, so a modified file is parsed again, and the least
+    recently used entries are removed once the cache is larger than max_bytes.
+    DataFrames with non-numeric columns or index are not cached.
+    """
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3):
+        """
+        :param directory: cache folder, default $HPCLAB_CACHE_DIR or ~/.cache/hpclab_repository
+        :param max_bytes: upper bound of the cache size on disk
+        """
+        if directory is None:
+            directory = os.environ.get('HPCLAB_CACHE_DIR',
+                                       os.path.join(os.path.expanduser('~'), '.cache', 'hpclab_repository'))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        # an existing cache may be larger than this max_bytes
+        self.evict()
+
+    def read(self, fp, reader_name, parse, **reader_kwargs):
+        """
+        :param fp: path of the text file
+        :param reader_name: name of the reader, part of the key
+        :param parse: function without arguments that parses the file into a DataFrame
+        :return: DataFrame, memory-mapped and read-only on a hit
+        """
+        key = self.key(fp, reader_name, reader_kwargs)
+        data_df = self.load(key)
+        if data_df is None:
+            data_df = parse()
+            self.store(key, data_df)
+        return data_df
+
+    def key(self, fp, reader_name, reader_kwargs):
+        stat = os.stat(fp)
+        identity = repr((os.path.abspath(fp), stat.st_size, stat.st_mtime_ns, reader_name,
+                         sorted(reader_kwargs.items())))
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def load(self, key):
+        import pandas as pd
+        meta_path, bin_path = self._paths(key)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            arrays = [np.memmap(bin_path, dtype=dtype, mode='r', offset=offset, shape=(meta['rows'],))
+                      for dtype, offset in zip(meta['dtypes'], meta['offsets'])]
+        except (OSError, ValueError, KeyError):
+            return None
+        # LRU: the mtime of the json file records the last use
+        os.utime(meta_path)
+        # plain ndarray views on the maps
+        arrays = [arr.view(np.ndarray) for arr in arrays]
+        index = pd.Index(arrays.pop(), name=meta['index_name']) if meta['has_index'] else pd.RangeIndex(meta['rows'])
+        data_df = pd.DataFrame(dict(enumerate(arrays)), index=index, copy=False)
+        data_df.columns = meta['columns']
+        return data_df
+
+    def store(self, key, data_df):
+        import pandas as pd
+        columns = [int(col) if isinstance(col, np.integer) else col for col in data_df.columns]
+        arrays = [data_df.iloc[:, i].to_numpy() for i in range(data_df.shape[1])]
+        has_index = not data_df.index.equals(pd.RangeIndex(len(data_df)))
+        if has_index:
+            arrays.append(data_df.index.to_numpy())
+        if not all(isinstance(col, (str, int)) for col in columns) or \
+                not all(arr.dtype.kind in 'biuf' for arr in arrays):
+            return
+        meta_path, bin_path = self._paths(key)
+        # a temporary file per thread and process, bulk_reader may parse the same file twice at the same time
+        tmp = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        offsets = []
+        offset = 0
+        with open(bin_path + tmp, 'wb') as f:
+            for arr in arrays:
+                # 64-byte aligned columns
+                offset = -(-offset // 64) * 64
+                f.seek(offset)
+                offsets.append(offset)
+                f.write(np.ascontiguousarray(arr).tobytes())
+                offset += arr.nbytes
+        meta = {'rows': len(data_df), 'columns': columns, 'dtypes': [arr.dtype.str for arr in arrays],
+                'offsets': offsets, 'has_index': has_index, 'index_name': data_df.index.name}
+        os.replace(bin_path + tmp, bin_path)
+        with open(meta_path + tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + tmp, meta_path)
+        self.evict()
+
+    def evict(self):
+        """
+            remove the least recently used entries until the cache fits in max_bytes
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                meta_path, bin_path = self._paths(name[:-5])
+                try:
+                    size = os.path.getsize(bin_path) + os.path.getsize(meta_path)
+                    entries.append((os.path.getmtime(meta_path), size, meta_path, bin_path))
+                except OSError:
+                    continue
+        total = sum(entry[1] for entry in entries)
+        for _, size, meta_path, bin_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(meta_path)
+                os.remove(bin_path)
+            except OSError:  # still memory-mapped on Windows
+                continue
+            total -= size
+
+    def clear(self):
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        self.evict()
+        self.max_bytes = max_bytes
+
+    def _paths(self, key):
+        return os.path.join(self.directory, key + '.json'), os.path.join(self.directory, key + '.bin')
+
+
+_reader_cache = None
+
+
+def enable_cache(directory=None, max_bytes=2 * 1024 ** 3):
+    """
+        cache every following rpt_reader/csv_reader call, see ReaderCache
+    :return: ReaderCache
+    """
+    global _reader_cache
+    _reader_cache = ReaderCache(directory, max_bytes)
+    return _reader_cache
+
+
+def disable_cache():
+    global _reader_cache
+    _reader_cache = None
+
+
+def _cached_read(cache, fp, reader_name, parse, **reader_kwargs):
+    if cache is None:
+        cache = _reader_cache
+    if not cache:
+        return parse()
+    return cache.read(fp, reader_name, parse, **reader_kwargs)
@@ -0,0 +1,428 @@
+# -*- coding:utf-8 -*-
+# Author:              Qi Wang, Tongji Univ. <wangqi14@tongji.edu.cn>
+# Established at:      2026/10/17
+# Modified at:         2026/10/17
+# Project:
+
+"""
+    Averaged spectral estimates: Welch PSD, cross-spectral densities and STFT spectrograms
+Records are cut into overlapping segments through a strided view (sliding_window_view, no copy of the record),
+and a batch of segments of all channels is detrended, windowed and transformed in one rfft call. Only one batch of
+segments is held at a time, see batch_bytes. Frequency is axis 0 of every result, as in my_dft:
+    frequency, psd = welch(motion, fs)                # psd (bins, channels)
+    frequency, g = csd_matrix(motion, fs)             # g (bins, channels, channels)
+    frequency, times, z = stft(motion, fs)            # z (bins, frames, channels)
+The scaling follows scipy.signal.welch/csd/stft/spectrogram, with detrend='constant' and no boundary padding.
+WelchAccumulator gives the same averages from blocks of a long record in constant memory.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from my_channels import sample_interval
+from my_profile import profiled
+
+# bytes of the windowed segments transformed in one rfft call
+BATCH_BYTES = 64 * 1024 ** 2
+
+
+def segment_window(window='hann', nperseg=1024):
+    """
+        scipy.signal.get_window, cached on (window, nperseg)
+    :param window: name of the window, (name, parameter) tuple, or an array of length nperseg
+    :return: float64 ndarray (nperseg,), shared between calls, do not modify it
+    """
+    if isinstance(window, np.ndarray) or isinstance(window, list):
+        window = np.asarray(window, dtype=float)
+        if window.shape != (nperseg,):
+            raise ValueError(f'window of length {len(window)} for segments of {nperseg} samples')
+        return window
+    return _segment_window(window, int(nperseg))
+
+
+@lru_cache(maxsize=64)
+def _segment_window(window, nperseg):
+    from scipy.signal import get_window
+    return get_window(window, nperseg)
+
+
+def _segment_parameters(n, nperseg, noverlap, nfft):
+    nperseg = min(int(nperseg), n)
+    noverlap = nperseg // 2 if noverlap is None else int(noverlap)
+    if not 0 <= noverlap < nperseg:
+        raise ValueError(f'noverlap={noverlap} must be in [0, nperseg={nperseg})')
+    nfft = nperseg if nfft is None else int(nfft)
+    if nfft < nperseg:
+        raise ValueError(f'nfft={nfft} must not be shorter than nperseg={nperseg}')
+    return nperseg, noverlap, nfft
+
+
+def segment_spectra(x, nperseg, noverlap, window, nfft=None, detrend='constant', workers=-1, batch_bytes=None):
+    """
+        rfft of the windowed segments of x along axis 0, in batches of segments
+    :param x: ndarray (samples, ...), at least nperseg samples
+    :param nperseg: samples per segment
+    :param noverlap: samples shared by neighbouring segments
+    :param window: window array (nperseg,)
+    :param nfft: FFT length of a segment, default nperseg
+    :param detrend: 'constant' to remove the mean of every segment, False for none
+    :param workers: threads used by scipy.fft, -1 for all cores
+    :param batch_bytes: bytes of the windowed segments of one batch, default BATCH_BYTES
+    :return: generator of complex ndarray (segments of the batch, ..., bins)
+    """
+    from scipy.fft import rfft
+    nfft = nperseg if nfft is None else nfft
+    step = nperseg - noverlap
+    # (segments, ..., nperseg) view of x, no data is copied
+    segments = np.lib.stride_tricks.sliding_window_view(x, nperseg, axis=0)[::step]
+    per_segment = max(1, int(np.prod(segments.shape[1:])) * max(x.itemsize, 8))
+    batch = max(1, (BATCH_BYTES if batch_bytes is None else batch_bytes) // per_segment)
+    dtype = np.result_type(x.dtype, np.float32)
+    window = window.astype(dtype, copy=False)
+    for start in range(0, segments.shape[0], batch):
+        block = segments[start: start + batch]
+        if detrend == 'constant':
+            block = block - block.mean(axis=-1, keepdims=True)
+        elif detrend:
+            raise ValueError(f"detrend must be 'constant' or False, got {detrend!r}")
+        else:
+            block = block.astype(dtype, copy=True)
+        block *= window
+        yield rfft(block, n=nfft, axis=-1, workers=workers)
+
+
+def _one_sided(spectrum, nfft, scale, first_bin=0):
+    """
+        scale the averaged |X|² or X*Y of a one-sided spectrum, frequency on the last axis
+    :param first_bin: rfft bin of the first element along the last axis
+    """
+    spectrum *= scale
+    # every bin except DC (and Nyquist for even nfft) stands for two bins of the full spectrum
+    index = first_bin + np.arange(spectrum.shape[-1])
+    single = (index == 0) | ((nfft % 2 == 0) & (index == nfft // 2))
+    spectrum *= np.where(single, 1., 2.)
+    return spectrum
+
+
+def _scale(window, fs, scaling):
+    if scaling == 'density':
+        return 1. / (fs * (window * window).sum())
+    if scaling == 'spectrum':
+        return 1. / window.sum() ** 2
+    raise ValueError(f"scaling must be 'density' or 'spectrum', got {scaling!r}")
+
+
+@profiled()
+def welch(motion, fs, nperseg=1024, noverlap=None, window='hann', nfft=None, detrend='constant', scaling='density',
+          workers=-1, batch_bytes=None):
+    """
+        Welch power spectral density, the mean of the segment periodograms
+    :param motion: ndarray (samples,) or (samples, channels)
+    :param fs: sampling frequency
+    :param nperseg: samples per segment, limited to the record length
+    :param noverlap: samples shared by neighbouring segments, default nperseg // 2
+    :param window: see segment_window
+    :param nfft: FFT length of a segment, default nperseg
+    :param detrend: 'constant' or False
+    :param scaling: 'density' (unit²/Hz) or 'spectrum' (unit²)
+    :param workers: threads used by scipy.fft, -1 for all cores
+    :param batch_bytes: see segment_spectra
+    :return: frequency (bins,), psd (bins,) or (bins, channels)
+    """
+    return csd(motion, None, fs, nperseg=nperseg, noverlap=noverlap, window=window, nfft=nfft, detrend=detrend,
+               scaling=scaling, workers=workers, batch_bytes=batch_bytes)
+
+
+@profiled()
+def csd(x, y, fs, nperseg=1024, noverlap=None, window='hann', nfft=None, detrend='constant', scaling='density',
+        workers=-1, batch_bytes=None):
+    """
+        Welch cross-spectral density conj(X) * Y of corresponding channels, see welch
+    :param x: ndarray (samples,) or (samples, channels)
+    :param y: ndarray broadcasting with x, None for the power spectral density of x
+    :return: frequency (bins,), csd (bins,) or (bins, channels), complex unless y is None
+    """
+    from scipy.fft import rfftfreq
+    x = np.asarray(x)
+    nperseg, noverlap, nfft = _segment_parameters(x.shape[0], nperseg, noverlap, nfft)
+    win = segment_window(window, nperseg)
+    options = dict(nfft=nfft, detrend=detrend, workers=workers, batch_bytes=batch_bytes)
+    total = 0.
+    count = 0
+    if y is None:
+        for z in segment_spectra(x, nperseg, noverlap, win, **options):
+            total = total + (z.real ** 2 + z.imag ** 2).sum(axis=0)
+            count += z.shape[0]
+    else:
+        y = np.asarray(y)
+        for zx, zy in zip(segment_spectra(x, nperseg, noverlap, win, **options),
+                          segment_spectra(y, nperseg, noverlap, win, **options)):
+            total = total + (np.conj(zx) * zy).sum(axis=0)
+            count += zx.shape[0]
+    spectrum = _one_sided(total / count, nfft, _scale(win, fs, scaling))
+    return rfftfreq(nfft, 1. / fs), np.moveaxis(spectrum, -1, 0)
+
+
+@profiled()
+def csd_matrix(motion, fs, reference=None, nperseg=1024, noverlap=None, window='hann', nfft=None, detrend='constant',
+               scaling='density', workers=-1, batch_bytes=None, frequency_range=None):
+    """
+        cross-spectral density matrix G[f, i, j] = csd(channel i, channel j) of all channel pairs, see welch
+    The products of a batch of segments are one stacked matrix product (bins, i, segments) @ (bins, segments, j).
+    :param motion: ndarray (samples, channels)
+    :param reference: positions of the row channels i, None for all channels
+    :param frequency_range: (low, high) limits of the returned bins, the matrix of 100 channels takes 160 kB per bin
+    :return: frequency (bins,), g (bins, rows, channels) complex, Hermitian in (i, j) for reference=None
+    """
+    from scipy.fft import rfftfreq
+    motion = np.asarray(motion)
+    if motion.ndim == 1:
+        motion = motion[:, None]
+    nperseg, noverlap, nfft = _segment_parameters(motion.shape[0], nperseg, noverlap, nfft)
+    win = segment_window(window, nperseg)
+    rows = slice(None) if reference is None else np.atleast_1d(reference)
+    frequency = rfftfreq(nfft, 1. / fs)
+    keep = slice(0, len(frequency))
+    if frequency_range is not None:
+        keep = slice(np.searchsorted(frequency, frequency_range[0], side='left'),
+                     np.searchsorted(frequency, frequency_range[1], side='right'))
+    total = 0.
+    count = 0
+    for z in segment_spectra(motion, nperseg, noverlap, win, nfft=nfft, detrend=detrend, workers=workers,
+                             batch_bytes=batch_bytes):
+        # (segments, channels, bins) -> (bins, channels, segments)
+        z = z[..., keep].transpose(2, 1, 0)
+        total = total + np.conj(z[:, rows]) @ z.transpose(0, 2, 1)
+        count += z.shape[2]
+    # _one_sided scales along the last axis, the frequency axis is moved there and back
+    spectrum = _one_sided(np.moveaxis(total / count, 0, -1), nfft, _scale(win, fs, scaling), first_bin=keep.start)
+    return frequency[keep], np.moveaxis(spectrum, -1, 0)
+
+
+@profiled()
+def stft(motion, fs, nperseg=256, noverlap=None, window='hann', nfft=None, detrend=False, workers=-1,
+         batch_bytes=None):
+    """
+        short-time Fourier transform, scipy.signal.stft with boundary=None and padded=False
+    :param motion: ndarray (samples,) or (samples, channels)
+    :param fs: sampling frequency
+    :return: frequency (bins,), times of the segment centres (frames,), z (bins, frames[, channels]) complex
+    """
+    return _frames(motion, fs, nperseg, noverlap, window, nfft, detrend, workers, batch_bytes, 'stft')
+
+
+@profiled()
+def spectrogram(motion, fs, nperseg=256, noverlap=None, window='hann', nfft=None, detrend='constant',
+                scaling='density', workers=-1, batch_bytes=None):
+    """
+        periodogram of every segment, scipy.signal.spectrogram with a hann window instead of ('tukey', 0.25)
+    :param motion: ndarray (samples,) or (samples, channels)
+    :param fs: sampling frequency
+    :param noverlap: default nperseg // 8 as in scipy.signal.spectrogram
+    :return: frequency (bins,), times of the segment centres (frames,), s (bins, frames[, channels])
+    """
+    if noverlap is None:
+        noverlap = min(int(nperseg), len(motion)) // 8
+    return _frames(motion, fs, nperseg, noverlap, window, nfft, detrend, workers, batch_bytes, scaling)
+
+
+def _frames(motion, fs, nperseg, noverlap, window, nfft, detrend, workers, batch_bytes, mode):
+    from scipy.fft import rfftfreq
+    motion = np.asarray(motion)
+    nperseg, noverlap, nfft = _segment_parameters(motion.shape[0], nperseg, noverlap, nfft)
+    win = segment_window(window, nperseg)
+    step = nperseg - noverlap
+    n_frames = (motion.shape[0] - nperseg) // step + 1
+    bins = nfft // 2 + 1
+    out = None
+    start = 0
+    for z in segment_spectra(motion, nperseg, noverlap, win, nfft=nfft, detrend=detrend, workers=workers,
+                             batch_bytes=batch_bytes):
+        if mode == 'stft':
+            z *= 1. / win.sum()
+        else:
+            z = _one_sided(z.real ** 2 + z.imag ** 2, nfft, _scale(win, fs, mode))
+        if out is None:
+            out = np.empty((bins, n_frames) + motion.shape[1:], dtype=z.dtype)
+        # (segments, ..., bins) -> (bins, segments, ...)
+        out[:, start: start + z.shape[0]] = np.moveaxis(z, -1, 0)
+        start += z.shape[0]
+    times = (nperseg / 2 + step * np.arange(n_frames)) / fs
+    return rfftfreq(nfft, 1. / fs), times, out
+
+
+class WelchAccumulator:
+    """
+        Welch averages of a record pushed in blocks, in constant memory
+    Segments are cut across block boundaries exactly as in one call on the whole record, so result() equals
+    welch / csd_matrix of the concatenated blocks.
+    acc = WelchAccumulator(fs=200, nperseg=1024)
+    for time, data, columns in rpt_chunk_reader('run01.rpt'):
+        acc.push(data)
+    frequency, psd = acc.result()
+    """
+
+    def __init__(self, fs, nperseg=1024, noverlap=None, window='hann', nfft=None, detrend='constant',
+                 scaling='density', matrix=False, reference=None, workers=-1):
+        """
+        :param fs: sampling frequency
+        :param matrix: accumulate the cross-spectral density matrix (csd_matrix) instead of the psd (welch)
+        :param reference: row channels of the matrix, see csd_matrix
+        other parameters: see welch
+        """
+        self.fs = fs
+        self.nperseg, self.noverlap, self.nfft = _segment_parameters(int(nperseg), nperseg, noverlap, nfft)
+        self.window = segment_window(window, self.nperseg)
+        self.detrend = detrend
+        self.scaling = scaling
+        self.matrix = matrix
+        self.reference = reference
+        self.workers = workers
+        self.reset()
+
+    def reset(self):
+        """
+            forget the pushed blocks
+        """
+        self.total = 0.
+        self.count = 0
+        self._tail = None
+
+    def push(self, block):
+        """
+        :param block: ndarray (samples,) or (samples, channels), the channel count must not change between calls
+        """
+        block = np.asarray(block)
+        if self.matrix and block.ndim == 1:
+            block = block[:, None]
+        buffer = block if self._tail is None else np.concatenate([self._tail, block], axis=0)
+        step = self.nperseg - self.noverlap
+        n_segments = 0 if buffer.shape[0] < self.nperseg else (buffer.shape[0] - self.nperseg) // step + 1
+        if n_segments:
+            used = buffer[: (n_segments - 1) * step + self.nperseg]
+            rows = slice(None) if self.reference is None else np.atleast_1d(self.reference)
+            for z in segment_spectra(used, self.nperseg, self.noverlap, self.window, nfft=self.nfft,
+                                     detrend=self.detrend, workers=self.workers):
+                if self.matrix:
+                    z = z.transpose(2, 1, 0)
+                    self.total = self.total + np.conj(z[:, rows]) @ z.transpose(0, 2, 1)
+                else:
+                    self.total = self.total + (z.real ** 2 + z.imag ** 2).sum(axis=0)
+                self.count += z.shape[0] if not self.matrix else z.shape[2]
+        # the samples of the next segment that are already here
+        self._tail = buffer[n_segments * step:].copy()
+
+    def result(self):
+        """
+        :return: frequency (bins,), psd (bins[, channels]) or g (bins, rows, channels)
+        """
+        from scipy.fft import rfftfreq
+        if not self.count:
+            raise ValueError(f'fewer than nperseg={self.nperseg} samples were pushed')
+        average = self.total / self.count
+        if self.matrix:
+            average = np.moveaxis(average, 0, -1)
+        spectrum = _one_sided(average, self.nfft, _scale(self.window, self.fs, self.scaling))
+        return rfftfreq(self.nfft, 1. / self.fs), np.moveaxis(spectrum, -1, 0)
+
+
+@profiled()
+def transfer_function(motion, fs, reference=0, responses=None, estimator='welch', bandwidth=None,
+                      smooth_window='hanning', spectrum=None, nperseg=1024, noverlap=None, window='hann', nfft=None,
+                      detrend='constant', workers=-1, batch_bytes=None):
+    """
+        H1/H2 transfer functions and coherence of the response channels relative to one reference channel
+    All responses are estimated together from the auto and cross spectra of the reference:
+        H1 = Gxy / Gxx    H2 = Gyy / Gyx    coherence = |Gxy|² / (Gxx * Gyy)
+    estimator='welch' averages the spectra over segments (see welch), estimator='dft' takes one FFT of the whole
+    record; bandwidth smooths the spectra along frequency with smooth_spectrum before the ratios are formed, which
+    is required for a meaningful coherence with the dft estimator.
+    :param motion: ndarray (samples, channels)
+    :param fs: sampling frequency
+    :param reference: position of the input channel (e.g. the shaking table)
+    :param responses: positions of the response channels, None for all channels except reference
+    :param estimator: 'welch' or 'dft'
+    :param bandwidth: smoothing bandwidth (Hz), None for no smoothing
+    :param smooth_window: window of smooth_spectrum, 'hanning', 'parzen', 'konno-ohmachi' or a callable
+    :param spectrum: my_signal.Spectrum of motion reused by the dft estimator, e.g. Motion.spectrum()
+    other parameters: see welch, used by the welch estimator
+    :return: dictionary
+    frequency (bins,)
+    H1, H2, coherence, Gyy, Gxy (bins, responses)
+    Gxx (bins,)
+    responses: positions of the response channels
+    """
+    motion = np.asarray(motion)
+    if motion.ndim == 1:
+        motion = motion[:, None]
+    responses = [i for i in range(motion.shape[1]) if i != reference] if responses is None else list(responses)
+    if estimator == 'welch':
+        nperseg, noverlap, nfft = _segment_parameters(motion.shape[0], nperseg, noverlap, nfft)
+        win = segment_window(window, nperseg)
+        channels = [reference] + responses
+        # one pass over the segments of the reference and response channels
+        gxx = gyy = gxy = 0.
+        count = 0
+        for z in segment_spectra(motion[:, channels], nperseg, noverlap, win, nfft=nfft, detrend=detrend,
+                                 workers=workers, batch_bytes=batch_bytes):
+            x, y = z[:, :1], z[:, 1:]
+            gxx = gxx + (x.real ** 2 + x.imag ** 2).sum(axis=0)
+            gyy = gyy + (y.real ** 2 + y.imag ** 2).sum(axis=0)
+            gxy = gxy + (np.conj(x) * y).sum(axis=0)
+            count += z.shape[0]
+        # a python float keeps float32 spectra in float32
+        scale = float(_scale(win, fs, 'density')) / count
+    elif estimator == 'dft':
+        if spectrum is None:
+            from scipy.fft import rfft
+            nfft = motion.shape[0]
+            z = rfft(motion, axis=0, workers=workers)
+        else:
+            nfft = spectrum.n_fft
+            z = spectrum['complex'].reshape(spectrum.n_fft // 2 + 1, -1)
+        x, y = z[:, reference][None], z[:, responses].T
+        gxx = x.real ** 2 + x.imag ** 2
+        gyy = y.real ** 2 + y.imag ** 2
+        gxy = np.conj(x) * y
+        scale = 1. / (fs * motion.shape[0])
+    else:
+        raise ValueError(f"estimator must be 'welch' or 'dft', got {estimator!r}")
+    # (channels, bins) -> (bins, channels)
+    gxx, gyy, gxy = (_one_sided(g * scale, nfft, 1.).T for g in (gxx, gyy, gxy))
+    from scipy.fft import rfftfreq
+    frequency = rfftfreq(nfft, 1. / fs)
+    if bandwidth is not None or isinstance(smooth_window, str) and \
+            smooth_window.lower() in ('konno-ohmachi', 'konno_ohmachi', 'ko'):
+        from my_signal import smooth_spectrum
+        gxx, gyy, gxy = (smooth_spectrum(frequency, g, bandwidth, window=smooth_window) for g in (gxx, gyy, gxy))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h1 = gxy / gxx
+        h2 = gyy / np.conj(gxy)
+        coherence = (gxy.real ** 2 + gxy.imag ** 2) / (gxx * gyy)
+    return {'frequency': frequency, 'H1': h1, 'H2': h2, 'coherence': coherence, 'Gxx': gxx[:, 0], 'Gyy': gyy,
+            'Gxy': gxy, 'responses': responses}
+
+
+def transfer_function_suite(records, reference=0, responses=None, max_workers=None, **options):
+    """
+        transfer_function of many runs, one run per worker process
+    :param records: iterable of (time, motion) pairs or objects with time and motion attributes (Motion)
+    :param reference: see transfer_function
+    :param responses: see transfer_function
+    :param max_workers: number of processes, None for the number of cores, 0 to run in this process
+    :param options: keyword arguments of transfer_function
+    :return: list of transfer_function dictionaries in the order of records
+    """
+    jobs = [(record.time, record.motion, reference, responses, options) if hasattr(record, 'motion') else
+            (record[0], record[1], reference, responses, options) for record in records]
+    if max_workers == 0:
+        return [_transfer_function_job(job) for job in jobs]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_transfer_function_job, jobs))
+
+
+def _transfer_function_job(job):
+    time, motion, reference, responses, options = job
+    return transfer_function(motion, 1. / sample_interval(time), reference=reference, responses=responses, **options)
@@ -4,3 +4,867 @@
 # Modified at:         2023/3/8 9:36                               
 # Project:
 
+
+import os
+import subprocess
+import sys
+
+REPOSITORY = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ('scipy', 'matplotlib', 'pandas')
+
+
+def _run_python(code):
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPOSITORY, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def test_lazy_imports():
+    for module in ('my_signal', 'my_rpt', 'my_output', 'my_pipeline', 'my_spectral', 'my_modal', 'my_resample',
+                   'my_intensity'):
+        loaded = _run_python(f'import sys, {module}; print(" ".join(m for m in {HEAVY_MODULES} if m in sys.modules))')
+        assert loaded == '', f'import {module} loads {loaded}'
+
+
+def test_benchmark_compare():
+    from my_benchmark import compare, run_benchmarks
+    results = run_benchmarks(['my_dft', 'my_hanning'], [(1000, 2)], repeat=1, min_time=0.)
+    assert set(results['results']) == {'my_dft[1000x2]', 'my_hanning[1000x2]'}
+    slower = {'results': {key: dict(value, best=value['best'] * 2) for key, value in results['results'].items()}}
+    assert all(row['regression'] for row in compare(slower, results, threshold=0.2))
+    assert not any(row['regression'] for row in compare(results, slower, threshold=0.2))
+
+
+def test_bulk_reader_errors(tmp_path):
+    from my_benchmark import synthetic_motion, write_rpt
+    from my_rpt import bulk_reader
+    for i in range(3):
+        write_rpt(str(tmp_path / f'run{i}.rpt'), *synthetic_motion(100, 2, seed=i))
+    files = [str(tmp_path / 'run*.rpt'), str(tmp_path / 'missing.rpt')]
+    results = list(bulk_reader(files, max_workers=2, max_pending=1))
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert all(result.data.shape == (100, 3) for result in results[:3])
+    assert results[3].data is None and isinstance(results[3].error, FileNotFoundError)
+
+
+def test_intensity_accumulator():
+    import numpy as np
+    from my_intensity import IntensityAccumulator, intensity_measures, running_rms
+    time_array = np.arange(4001) * 0.005
+    acc = np.random.default_rng(0).standard_normal((4001, 2)) * np.exp(-((time_array - 8) / 3) ** 2)[:, None]
+    accumulator = IntensityAccumulator(0.005, scale=9.81, rms_window=100)
+    rms = np.concatenate([accumulator.push(acc[i: i + 333]) for i in range(0, 4001, 333)])
+    expected = intensity_measures(acc, 0.005, scale=9.81)
+    assert all(np.allclose(value, expected[name], rtol=1e-10, atol=1e-12)
+               for name, value in accumulator.result().items())
+    assert np.allclose(rms, running_rms(acc, 100), atol=1e-10)
+
+
+def test_float32_accuracy(tmp_path):
+    import numpy as np
+    from my_benchmark import synthetic_motion, write_rpt
+    from my_channels import ChannelSet
+    from my_output import ExportArray
+    from my_rpt import rpt_reader
+    from my_signal import Motion, smooth_spectrum
+    write_rpt(str(tmp_path / 'run.rpt'), *synthetic_motion(20000, 3))
+    single, double = (Motion(ChannelSet.from_dataframe(rpt_reader(str(tmp_path / 'run.rpt'), dtype=dtype, cache=False)))
+                      for dtype in (np.float32, None))
+
+    def check(value32, value64, bound=1e-5):
+        assert value32.dtype in (np.float32, np.complex64)
+        assert np.abs(value32 - value64).max() <= bound * np.abs(value64).max()
+
+    assert single.time.dtype == np.float64
+    check(single.motion, double.motion)
+    spectrum32, spectrum64 = single.dft(), double.dft()
+    check(spectrum32['complex'], spectrum64['complex'])
+    check(spectrum32['amplitude'], spectrum64['amplitude'])
+    check(smooth_spectrum(spectrum32['frequency'], spectrum32['amplitude'], 0.5),
+          smooth_spectrum(spectrum64['frequency'], spectrum64['amplitude'], 0.5))
+    check(single.filter(cutoff=20), double.filter(cutoff=20))
+    check(single.integrate(2, detrend_order=1, highpass=0.2).motion,
+          double.integrate(2, detrend_order=1, highpass=0.2).motion)
+    ExportArray.export_to_csv(ChannelSet(single.time, single.motion), str(tmp_path / 'run.csv'))
+    exported = np.loadtxt(str(tmp_path / 'run.csv'), delimiter=',', skiprows=1)
+    assert np.array_equal(exported[:, 1:].astype(np.float32), single.motion)
+
+
+def _smooth_reference(amp, window):
+    """
+        three-branch loop of the former my_hanning for one channel
+    """
+    import numpy as np
+    n = (len(window) - 1) // 2
+    out = np.empty(len(amp))
+    for i in range(len(amp)):
+        if i < n:
+            out[i] = np.dot(window[n - i:], amp[: i + n + 1]) / np.sum(window[n - i:])
+        elif i >= len(amp) - n:
+            out[i] = np.dot(window[: n + len(amp) - i], amp[i - n:]) / np.sum(window[: n + len(amp) - i])
+        else:
+            out[i] = np.dot(window, amp[i - n: i + n + 1]) / np.sum(window)
+    return out
+
+
+def test_smooth_spectrum_reference():
+    import numpy as np
+    from scipy.signal.windows import parzen
+    from my_signal import my_hanning, smooth_spectrum
+    freq = np.arange(801) * 0.05
+    amp = np.abs(np.random.default_rng(0).standard_normal((801, 3))) + 1.
+    # bandwidth 1 Hz -> 21 bins
+    for window, function in (('hanning', np.hanning), ('parzen', parzen)):
+        expected = np.column_stack([_smooth_reference(amp[:, k], function(21)) for k in range(3)])
+        assert np.allclose(smooth_spectrum(freq, amp, 1., window=window), expected, rtol=1e-12, atol=0)
+        assert np.allclose(smooth_spectrum(freq, amp[:, 1], 1., window=window), expected[:, 1], rtol=1e-12, atol=0)
+    assert np.allclose(my_hanning(freq, amp[:, 0], 1.), _smooth_reference(amp[:, 0], np.hanning(21)), rtol=1e-12)
+    # Konno-Ohmachi, weights truncated beyond three lobes, bins at f <= 0 passed through
+    b = 40.
+    expected = amp.copy()
+    for i in range(1, len(freq)):
+        x = b * np.log10(freq[1:] / freq[i])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = (np.sin(x) / x) ** 4
+        w[x == 0] = 1.
+        w[np.abs(x) > 3 * np.pi] = 0.
+        expected[i] = w @ amp[1:] / w.sum()
+    assert np.allclose(smooth_spectrum(freq, amp, window='konno-ohmachi', b=b, block_size=64), expected,
+                       rtol=1e-12, atol=0)
+
+
+def test_reader_cache(tmp_path):
+    import numpy as np
+    import pytest
+    from my_rpt import ReaderCache, csv_reader
+    fp = tmp_path / 'run.csv'
+    fp.write_text('t,a\n0,1.5\n1,2.5\n')
+    cache = ReaderCache(str(tmp_path / 'cache'))
+
+    def read():
+        return csv_reader(str(fp), header=0, index_col=None, drop_labels=[], cache=cache)
+
+    parsed = read()
+    hit = read()
+    assert len(os.listdir(cache.directory)) == 2
+    assert np.array_equal(hit.to_numpy(), parsed.to_numpy()) and list(hit.columns) == ['t', 'a']
+    # a hit is a read-only memory map
+    values = hit['a'].to_numpy()
+    assert not values.flags.writeable
+    with pytest.raises(ValueError):
+        values[0] = 0.
+    # rewriting the file changes size and mtime, the entry is not used
+    fp.write_text('t,a\n0,1.5\n1,2.5\n2,3.5\n')
+    os.utime(fp, ns=(os.stat(fp).st_atime_ns, os.stat(fp).st_mtime_ns + 10 ** 9))
+    assert np.array_equal(read()['a'].to_numpy(), [1.5, 2.5, 3.5])
+    assert len(os.listdir(cache.directory)) == 4
+
+    # LRU eviction, on store and when a cache is opened with a smaller max_bytes
+    counter = iter(range(100))
+
+    def parse():
+        next(counter)
+        import pandas as pd
+        return pd.DataFrame({'a': np.zeros(1000)})
+
+    cache = ReaderCache(str(tmp_path / 'lru'))
+    cache.read(str(fp), 'first', parse)
+    size = sum(os.path.getsize(os.path.join(cache.directory, name)) for name in os.listdir(cache.directory))
+    cache = ReaderCache(cache.directory, max_bytes=2 * size + size // 2)
+    cache.read(str(fp), 'second', parse)
+    # the first entry becomes the most recently used one
+    os.utime(cache._paths(cache.key(str(fp), 'first', {}))[0], (1e9, 2e9))
+    os.utime(cache._paths(cache.key(str(fp), 'second', {}))[0], (1e9, 1e9))
+    cache.read(str(fp), 'third', parse)
+    assert cache.load(cache.key(str(fp), 'second', {})) is None
+    assert cache.load(cache.key(str(fp), 'first', {})) is not None
+    assert cache.load(cache.key(str(fp), 'third', {})) is not None
+    assert next(counter) == 3
+    ReaderCache(cache.directory, max_bytes=size)
+    assert len(os.listdir(cache.directory)) == 2
+
+
+def test_response_spectrum_lsim():
+    import numpy as np
+    from scipy.signal import lsim
+    from my_response_spectrum import response_spectrum
+    time = np.arange(2000) * 0.01
+    acc = np.random.default_rng(1).standard_normal((2000, 2))
+    periods = np.array([0.05, 0.3, 1., 4.])
+    damping = np.array([0.02, 0.05])
+    result = response_spectrum(time, acc, periods=periods, damping=damping)
+    assert result['Sd'].shape == (4, 2, 2)
+    for i, period in enumerate(periods):
+        omega = 2 * np.pi / period
+        for j, xi in enumerate(damping):
+            # x'' + 2ξωx' + ω²x = -acc, first-order hold of acc as in Nigam & Jennings
+            system = ([[0., 1.], [-omega ** 2, -2 * xi * omega]], [[0.], [-1.]], [[1., 0.]], [[0.]])
+            for k in range(2):
+                _, x, _ = lsim(system, acc[:, k], time)
+                assert np.isclose(result['Sd'][i, j, k], np.max(np.abs(x)), rtol=1e-8)
+    assert np.allclose(result['Sa'], (2 * np.pi / periods[:, None, None]) ** 2 * result['Sd'])
+
+
+def test_streaming_filter(tmp_path):
+    import numpy as np
+    from scipy.signal import sosfilt
+    from my_rpt import replay_reader
+    from my_signal import StreamingFilter
+    data = np.random.default_rng(2).standard_normal((1000, 3))
+    filt = StreamingFilter(cutoff=20, fs=200)
+    expected = sosfilt(filt.sos, data, axis=0)
+    bounds = [0, 1, 8, 8, 300, 301, 777, 1000]
+    pushed = np.concatenate([filt.push(data[a: b]) for a, b in zip(bounds[:-1], bounds[1:])])
+    assert np.allclose(pushed, expected, rtol=1e-12, atol=1e-14)
+    filt.reset()
+    pushed = np.concatenate([filt.push(data[a: b, 0]) for a, b in zip(bounds[:-1], bounds[1:])])
+    assert np.allclose(pushed, expected[:, 0], rtol=1e-12, atol=1e-14)
+
+    # the chunks of a replayed file cover the record once, in order, whatever the block size
+    time = np.arange(1000) / 200
+    np.savetxt(str(tmp_path / 'run.csv'), np.column_stack([time, data]), delimiter=',', header='t,a,b,c',
+               comments='')
+    chunks = list(replay_reader(str(tmp_path / 'run.csv'), chunk_duration=0.1, realtime=False, block_size=37))
+    assert all(len(chunk.time) == 20 for chunk in chunks) and chunks[0].columns == ['a', 'b', 'c']
+    # the text round trip may be off by one ulp
+    assert np.allclose(np.concatenate([chunk.time for chunk in chunks]), time, rtol=1e-15, atol=0)
+    assert np.allclose(np.concatenate([chunk.data for chunk in chunks]), data, rtol=1e-15, atol=0)
+    filt.reset()
+    assert np.allclose(np.concatenate([filt.push(chunk.data) for chunk in chunks]), expected, rtol=1e-12, atol=1e-14)
+
+
+def test_run_pipeline(tmp_path):
+    import numpy as np
+    import pytest
+    from my_benchmark import synthetic_motion, write_csv, write_rpt
+    from my_pipeline import run_pipeline
+    campaign = tmp_path / 'campaign'
+    campaign.mkdir()
+    # 100 Hz runs: the default 60 Hz cutoff would be above the Nyquist frequency
+    write_rpt(str(campaign / 'run01.rpt'), *synthetic_motion(1000, 2, fs=100))
+    write_csv(str(campaign / 'run02.csv'), *synthetic_motion(1000, 2, fs=100, seed=1))
+    summary = run_pipeline(str(campaign), max_workers=0)
+    assert summary['processed'] == ['run01.rpt', 'run02.csv'] and not summary['failed']
+    with open(campaign / 'output' / 'run01_spectrum.csv') as f:
+        assert f.readline().strip() == 'Frequency,ACC0,ACC1'
+    with open(campaign / 'output' / 'run02_motion.csv') as f:
+        assert f.readline().strip() == 'Time,ACC0,ACC1'
+    spectrum = np.loadtxt(str(campaign / 'output' / 'run01_spectrum.csv'), delimiter=',', skiprows=1)
+    assert spectrum.shape[1] == 3 and spectrum[-1, 0] == pytest.approx(50.)
+
+    assert run_pipeline(str(campaign), max_workers=0)['skipped'] == ['run01.rpt', 'run02.csv']
+    assert run_pipeline(str(campaign), max_workers=0, force=True)['processed'] == ['run01.rpt', 'run02.csv']
+    write_csv(str(campaign / 'run02.csv'), *synthetic_motion(1000, 2, fs=100, seed=2))
+    summary = run_pipeline(str(campaign), max_workers=0)
+    assert summary['processed'] == ['run02.csv'] and summary['skipped'] == ['run01.rpt']
+    # new stages recompute every run, a cutoff above the Nyquist frequency is reported per run
+    summary = run_pipeline(str(campaign), [{'stage': 'read'}, {'stage': 'filter', 'cutoff': 60}], max_workers=0)
+    assert sorted(summary['failed']) == ['run01.rpt', 'run02.csv'] and 'Nyquist' in summary['failed']['run01.rpt']
+
+
+def test_decimate_line():
+    import numpy as np
+    import pytest
+    from my_output import decimate_lttb, decimate_minmax
+    x = np.arange(100000) * 0.005
+    y = np.random.default_rng(3).standard_normal(100000)
+    y[12345], y[67890] = 50., -40.
+    for xd, yd in (decimate_minmax(x, y, 500), decimate_lttb(x, y, 1000)):
+        assert len(xd) <= 1002 and np.all(np.diff(xd) > 0)
+        # the peaks, the first and the last points are kept
+        assert yd.max() == 50. and yd.min() == -40.
+        assert xd[0] == x[0] and xd[-1] == x[-1]
+    xd, yd = decimate_minmax(x, y, 500)
+    buckets = y.reshape(500, -1)
+    assert np.array_equal(np.sort(yd), np.sort(np.unique(np.concatenate([buckets.min(axis=1), buckets.max(axis=1),
+                                                                         y[[0, -1]]]))))
+    # short lines are returned whole
+    for xd, yd in (decimate_minmax(x[:300], y[:300], 500), decimate_lttb(x[:1000], y[:1000], 1000)):
+        assert np.array_equal(xd, x[:len(xd)]) and np.array_equal(yd, y[:len(yd)]) and len(xd) in (300, 1000)
+    xd, yd = decimate_lttb(x, y, 2)
+    assert np.array_equal(xd, x[[0, -1]]) and np.array_equal(yd, y[[0, -1]])
+    assert len(decimate_lttb(x, y, 3)[0]) == 3
+    with pytest.raises(ValueError):
+        decimate_lttb(x, y, 1)
+    with pytest.raises(ValueError):
+        decimate_minmax(x, y, 0)
+
+
+def test_render_batch(tmp_path):
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from PIL import Image
+    from my_output import Export2D, Line, render_batch, save_figure
+    # raster formats are written from one Agg rendering by PIL, only the vector formats go through savefig
+    fig = Figure(figsize=(2, 1), dpi=50)
+    FigureCanvasAgg(fig)
+    fig.add_subplot().plot([0, 1], [1, 0])
+    saved = []
+    fig.savefig = lambda name, format: saved.append(format)
+    save_figure(fig, str(tmp_path / 'figure'), ('png', 'jpg', 'svg'))
+    assert saved == ['svg']
+    with Image.open(tmp_path / 'figure.png') as png, Image.open(tmp_path / 'figure.jpg') as jpg:
+        assert png.size == jpg.size == (100, 50) and png.mode == 'RGBA' and jpg.mode == 'RGB'
+
+    x = np.linspace(0, 1, 50000)
+    jobs = [(Export2D([Line(x, np.sin(20 * x), 'Time', f'run{i}')]), 'plot_single',
+             {'fig_save_name': str(tmp_path / f'run{i}'), 'fig_save_format': ('png', 'svg'), 'dpi': 50,
+              'decimate': 'minmax'}) for i in range(3)]
+    jobs.append((Export2D([Line(x, x, 'Time', 'bad')]), 'plot_single',
+                 {'fig_save_name': str(tmp_path / 'bad'), 'fig_save_format': ('png',), 'decimate': 'spline'}))
+    for max_workers in (0, 2):
+        for path in tmp_path.glob('run*'):
+            path.unlink()
+        results = render_batch(jobs, max_workers=max_workers)
+        assert [result['name'] for result in results] == [job[2]['fig_save_name'] for job in jobs]
+        assert all(result['error'] is None for result in results[:3]) and 'spline' in results[3]['error']
+        assert all((tmp_path / f'run{i}.{fmt}').exists() for i in range(3) for fmt in ('png', 'svg'))
+
+
+def test_export_lines(tmp_path):
+    import h5py
+    import numpy as np
+    import pandas as pd
+    import pytest
+    from my_output import ExportArray, Line, export_lines
+    # export_to_csv writes float64 as the former np.savetxt(fmt='%s') did
+    value = np.random.default_rng(4).standard_normal((50, 3)) * 10. ** np.arange(-6, 9, 5)
+    np.savetxt(str(tmp_path / 'savetxt.csv'), value, delimiter=',', fmt='%s')
+    ExportArray.export_to_csv(value, str(tmp_path / 'export.csv'), chunk_rows=7)
+    assert (tmp_path / 'export.csv').read_text() == (tmp_path / 'savetxt.csv').read_text()
+
+    x = np.arange(10) * 0.1
+    lines = [Line(x, np.sin(x), 'time', 'a'), Line(x[:6], np.cos(x[:6]), 'time', 'b')]
+    assert export_lines(lines, str(tmp_path / 'lines.csv'), chunk_rows=4) == ['time', 'a', 'time_1', 'b']
+    csv = pd.read_csv(tmp_path / 'lines.csv', float_precision='round_trip')
+    assert list(csv.columns) == ['time', 'a', 'time_1', 'b']
+    assert np.array_equal(csv['a'], np.sin(x)) and csv['b'].isna().sum() == 4
+    assert np.array_equal(csv['b'][:6], np.cos(x[:6]))
+
+    export_lines(lines, str(tmp_path / 'lines.npz'))
+    with np.load(tmp_path / 'lines.npz') as npz:
+        assert np.array_equal(npz['time_1'], x[:6]) and np.array_equal(npz['a'], np.sin(x))
+    export_lines(lines, str(tmp_path / 'lines.h5'), chunk_rows=4)
+    with h5py.File(tmp_path / 'lines.h5', 'r') as h5:
+        assert h5['b'].shape == (6,) and np.array_equal(h5['b'][:], np.cos(x[:6]))
+    export_lines(lines, str(tmp_path / 'lines.parquet'), chunk_rows=4)
+    parquet = pd.read_parquet(tmp_path / 'lines.parquet')
+    assert np.array_equal(parquet['a'], np.sin(x)) and parquet['b'].isna().sum() == 4
+    with pytest.raises(ValueError):
+        export_lines(lines, str(tmp_path / 'lines.npy'))
+    # a shared x axis is written once
+    assert export_lines(lines[:1] + [Line(x, np.cos(x), 'time', 'b')], str(tmp_path / 'shared.npy')) == \
+        ['time', 'a', 'b']
+    assert np.array_equal(np.load(tmp_path / 'shared.npy'), np.column_stack([x, np.sin(x), np.cos(x)]))
+
+
+def test_motion_spectrum_cache():
+    import numpy as np
+    from my_signal import Motion, my_dft
+    time = np.arange(1000) * 0.005
+    data = np.random.default_rng(5).standard_normal((1000, 2)) + 1.
+    record = Motion(time, data.copy())
+    spectrum = record.spectrum()
+    amplitude = record.dft(('amplitude',))['amplitude']
+    assert record.spectrum() is spectrum and record.dft(('amplitude',))['amplitude'] is amplitude
+    assert record.spectrum(n_fft=2048) is not spectrum
+    assert np.allclose(amplitude, my_dft(time, data, quantities=('amplitude',))['amplitude'])
+    # assigning motion or time and detrending in place drop the cached spectrum
+    spectrum = record.spectrum()
+    record.detrend(inplace=True)
+    assert record.spectrum() is not spectrum and record.dft(('amplitude',))['amplitude'][0, 0] < 1e-12
+    spectrum = record.spectrum()
+    record.motion = 2 * data
+    assert record.spectrum() is not spectrum
+    assert np.allclose(record.dft(('amplitude',))['amplitude'], 2 * amplitude)
+    spectrum = record.spectrum()
+    record.time = 2 * time
+    assert record.spectrum() is not spectrum and record.spectrum().frequency[-1] == 50.
+    # without the cache every call computes the spectrum
+    record = Motion(time, data, cache_bytes=0)
+    assert record.spectrum() is not record.spectrum()
+
+
+def test_spectral_scipy():
+    import numpy as np
+    from scipy import signal
+    from my_spectral import WelchAccumulator, csd, csd_matrix, spectrogram, stft, welch
+    data = np.random.default_rng(6).standard_normal((5000, 3)) + np.arange(3)
+    options = dict(nperseg=512, noverlap=200, window='hann')
+    for scaling in ('density', 'spectrum'):
+        frequency, psd = welch(data, 200., scaling=scaling, batch_bytes=100000, **options)
+        f_ref, psd_ref = signal.welch(data, 200., axis=0, scaling=scaling, **options)
+        assert np.allclose(frequency, f_ref) and np.allclose(psd, psd_ref, rtol=1e-10, atol=0)
+    frequency, g = csd(data[:, 0], data[:, 1], 200., nfft=1024, **options)
+    assert np.allclose(g, signal.csd(data[:, 0], data[:, 1], 200., nfft=1024, **options)[1], rtol=1e-10, atol=1e-15)
+    frequency, g = csd_matrix(data, 200., frequency_range=(10., 40.), **options)
+    assert frequency[0] >= 10. and frequency[-1] <= 40. and g.shape == (len(frequency), 3, 3)
+    for i in range(3):
+        for j in range(3):
+            f_ref, g_ref = signal.csd(data[:, i], data[:, j], 200., **options)
+            keep = (f_ref >= 10.) & (f_ref <= 40.)
+            assert np.allclose(g[:, i, j], g_ref[keep], rtol=1e-10, atol=1e-15)
+    accumulator = WelchAccumulator(200., **options)
+    for start in range(0, 5000, 777):
+        accumulator.push(data[start: start + 777])
+    assert np.allclose(accumulator.result()[1], welch(data, 200., **options)[1], rtol=1e-12, atol=0)
+
+    frequency, times, z = stft(data, 200., nperseg=256, noverlap=128)
+    f_ref, t_ref, z_ref = signal.stft(data, 200., nperseg=256, noverlap=128, axis=0, boundary=None, padded=False)
+    # scipy puts the segment axis last
+    assert np.allclose(times, t_ref) and np.allclose(z, np.moveaxis(z_ref, -1, 1), rtol=1e-10, atol=1e-14)
+    frequency, times, s = spectrogram(data[:, 0], 200., nperseg=256)
+    f_ref, t_ref, s_ref = signal.spectrogram(data[:, 0], 200., window='hann', nperseg=256)
+    assert np.allclose(times, t_ref) and np.allclose(s, s_ref, rtol=1e-10, atol=0)
+
+
+def test_transfer_function_scipy():
+    import numpy as np
+    from scipy import signal
+    from my_spectral import transfer_function
+    rng = np.random.default_rng(7)
+    table = rng.standard_normal(8000)
+    b, a = signal.butter(2, [4., 6.], btype='band', fs=200.)
+    response = signal.lfilter(b, a, table)[:, None] * [1., 2.] + 0.1 * rng.standard_normal((8000, 2))
+    motion = np.column_stack([table, response])
+    result = transfer_function(motion, 200., nperseg=512)
+    _, gxx = signal.welch(table, 200., nperseg=512)
+    for k in range(2):
+        _, gxy = signal.csd(table, response[:, k], 200., nperseg=512)
+        _, gyy = signal.welch(response[:, k], 200., nperseg=512)
+        _, coherence = signal.coherence(table, response[:, k], 200., nperseg=512)
+        assert np.allclose(result['H1'][:, k], gxy / gxx, rtol=1e-9)
+        assert np.allclose(result['H2'][:, k], gyy / np.conj(gxy), rtol=1e-9)
+        assert np.allclose(result['coherence'][:, k], coherence, rtol=1e-9)
+    # a callable smoothing window
+    smoothed = transfer_function(motion, 200., estimator='dft', bandwidth=1.)
+    assert np.allclose(transfer_function(motion, 200., estimator='dft', bandwidth=1., smooth_window=np.hanning)['H1'],
+                       smoothed['H1'])
+    assert np.allclose(transfer_function(motion, 200., estimator='dft', smooth_window=np.hanning)['H1'],
+                       transfer_function(motion, 200., estimator='dft')['H1'], equal_nan=True)
+
+
+def test_fdd_two_storey():
+    import numpy as np
+    from scipy import linalg, signal
+    from my_modal import fdd, mac
+    # two-storey shear frame, 2 % modal damping, white noise forces on both floors
+    m = np.eye(2)
+    k = 400. * np.array([[2., -1.], [-1., 1.]])
+    omega2, phi = linalg.eigh(k, m)
+    omega = np.sqrt(omega2)
+    c = m @ phi @ np.diag(2 * 0.02 * omega) @ phi.T @ m
+    a = np.block([[np.zeros((2, 2)), np.eye(2)], [-k, -c]])
+    b = np.vstack([np.zeros((2, 2)), np.eye(2)])
+    fs = 50.
+    system = signal.cont2discrete((a, b, np.hstack([np.eye(2), np.zeros((2, 2))]), np.zeros((2, 2))), 1 / fs)
+    _, displacement, _ = signal.dlsim(system, np.random.default_rng(8).standard_normal((60000, 2)))
+    result = fdd(displacement, fs, nperseg=2048, n_modes=2, frequency_range=(0.5, 10.))
+    assert np.allclose(result['natural_frequency'], omega / (2 * np.pi), atol=2 * fs / 2048)
+    assert np.all(np.diag(mac(result['mode_shapes'], phi)) > 0.999)
+    assert np.all(result['mac'][~np.eye(2, dtype=bool)] < 0.01)
+    assert np.all((result['damping'] > 0.01) & (result['damping'] < 0.035))
+
+
+def test_detrend_integrate_scipy():
+    import numpy as np
+    from scipy import signal
+    from scipy.integrate import cumulative_trapezoid
+    from my_signal import Integrator, Motion, detrend, integrate
+    time = np.arange(3001) * 0.005
+    data = np.random.default_rng(9).standard_normal((3001, 2)) + np.outer(time, [1., -2.]) + 0.3 * time[:, None] ** 2
+    assert np.allclose(detrend(data), signal.detrend(data, axis=0, type='constant'), rtol=0, atol=1e-12)
+    assert np.allclose(detrend(data, order=1, block_size=256), signal.detrend(data, axis=0, type='linear'),
+                       rtol=0, atol=1e-12)
+    quadratic = data - np.polynomial.polynomial.polyval(time, np.polynomial.polynomial.polyfit(time, data, 2)).T
+    assert np.allclose(detrend(data, order=2, block_size=256), quadratic, rtol=0, atol=1e-12)
+    in_place = data.copy()
+    assert detrend(in_place, order=1, out=in_place) is in_place
+    assert np.allclose(in_place, signal.detrend(data, axis=0, type='linear'), rtol=0, atol=1e-12)
+
+    expected = cumulative_trapezoid(data, dx=0.005, axis=0, initial=0)
+    assert np.allclose(integrate(data, 0.005, block_size=256), expected, rtol=1e-12, atol=1e-12)
+    assert np.allclose(integrate(data[:, 0], 0.005, initial=1.), expected[:, 0] + 1., rtol=1e-12, atol=1e-12)
+    integrator = Integrator(0.005)
+    bounds = [0, 1, 2, 700, 700, 2999, 3001]
+    pushed = np.concatenate([integrator.push(data[a: b]) for a, b in zip(bounds[:-1], bounds[1:])])
+    assert np.allclose(pushed, expected, rtol=1e-12, atol=1e-12)
+    displacement = Motion(time, data).integrate(2, detrend_order=None).motion
+    assert np.allclose(displacement, cumulative_trapezoid(expected, dx=0.005, axis=0, initial=0), rtol=1e-12,
+                       atol=1e-12)
+
+
+def test_streaming_resampler(tmp_path):
+    import numpy as np
+    from scipy.signal import resample_poly
+    from my_resample import StreamingResampler, resample
+    from my_signal import Motion, Spectrum
+    data = np.random.default_rng(10).standard_normal((3001, 2))
+    bounds = [0, 1, 5, 5, 400, 1234, 2900, 3001]
+    for up, down in ((1, 4), (3, 2), (32, 25), (2, 6)):
+        expected = resample(data, up, down)
+        assert np.allclose(expected, resample_poly(data, up, down, axis=0), rtol=1e-12, atol=1e-13)
+        resampler = StreamingResampler(up, down)
+        blocks = [resampler.push(data[a: b]) for a, b in zip(bounds[:-1], bounds[1:])] + [resampler.flush()]
+        assert np.allclose(np.concatenate(blocks), expected, rtol=1e-10, atol=1e-12)
+        blocks = [resampler.push(data[a: b, 1]) for a, b in zip(bounds[:-1], bounds[1:])] + [resampler.flush()]
+        assert np.allclose(np.concatenate(blocks), expected[:, 1], rtol=1e-10, atol=1e-12)
+    # rounded time columns: one averaged time step for fs, the spectrum and integrate
+    time = np.round(np.arange(3001) / 300, 3)
+    record = Motion(time, data)
+    assert record.fs == 300. and Spectrum(time, data).dt == 1 / 300
+    assert np.isclose(record.integrate(detrend_order=None).motion[-1, 0],
+                      np.trapezoid(data[:, 0], dx=1 / 300), rtol=1e-12)
+    # the other readers of a time column: response spectra, the transfer function suite and replay_reader
+    from my_response_spectrum import response_spectrum
+    from my_rpt import replay_reader
+    from my_spectral import transfer_function_suite
+    assert np.allclose(response_spectrum(time, data, periods=[0.5])['Sd'],
+                       response_spectrum(np.arange(3001) / 300, data, periods=[0.5])['Sd'], rtol=1e-9)
+    assert transfer_function_suite([record], max_workers=0, nperseg=300)[0]['frequency'][1] == 1.
+    np.savetxt(str(tmp_path / 'run.csv'), np.column_stack([time, data]), delimiter=',', header='t,a,b', comments='',
+               fmt='%.3f')
+    chunks = list(replay_reader(str(tmp_path / 'run.csv'), chunk_duration=0.1, realtime=False, block_size=500))
+    assert [len(chunk.time) for chunk in chunks] == [30] * 100 + [1]
+
+
+def test_intensity_one_channel():
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+    from my_intensity import IntensityAccumulator, intensity_measures, pga, running_peak
+    time_array = np.arange(4001) * 0.005
+    acc = np.random.default_rng(11).standard_normal((4001, 2)) * np.exp(-((time_array - 8) / 3) ** 2)[:, None]
+    # one channel gives python scalars equal to the column of the two-channel result
+    measures = intensity_measures(acc, 0.005)
+    single = intensity_measures(acc[:, 1], 0.005)
+    assert all(type(value) is float and np.isclose(value, measures[name][1], rtol=1e-12)
+               for name, value in single.items())
+    peak, index = pga(acc[:, 0])
+    assert type(peak) is float and type(index) is int and peak == np.abs(acc[:, 0]).max()
+    accumulator = IntensityAccumulator(0.005)
+    accumulator.push(acc[:, 1])
+    assert accumulator.result() == single
+
+    for window in (1, 7, 100, 4001):
+        expected = np.abs(sliding_window_view(acc, window, axis=0)).max(axis=-1)
+        assert np.array_equal(running_peak(acc, window), expected)
+        assert np.array_equal(running_peak(acc[:, 0], window), expected[:, 0])
+    assert running_peak(acc, 5000).shape == (0, 2)
+
+    # a coarse Arias curve shifts the bounds of the significant duration by less than one resolution step
+    accumulator = IntensityAccumulator(0.005, resolution=0.1)
+    for start in range(0, 4001, 333):
+        accumulator.push(acc[start: start + 333])
+    coarse = accumulator.result()
+    assert np.allclose(coarse['d5_95_start'], measures['d5_95_start'], rtol=0, atol=0.1)
+    assert np.allclose(coarse['d5_95'], measures['d5_95'], rtol=0, atol=0.2)
+    assert all(np.allclose(coarse[name], measures[name], rtol=1e-10) for name in ('pga', 'rms', 'arias', 'cav'))
+
+
+def _dft_reference(time, channel, n_fft):
+    """
+        formulas of the former single-channel my_dft, the amplitude normalized by the record length
+    """
+    import numpy as np
+    dt = time[1] - time[0]
+    z = np.fft.fft(channel, n_fft)
+    t_n = int(n_fft / 2) + 1
+    amplitude = 2 * np.abs(z)[0: t_n] / len(channel)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {'frequency': np.linspace(0, int(n_fft / 2) / (dt * n_fft), t_n), 'amplitude': amplitude,
+                'magnitude': np.abs(z)[0: t_n], 'complex': z[0: t_n],
+                'phase': np.arctan(np.imag(z[0: t_n]) / np.real(z[0: t_n])),
+                'powers': np.sqrt(1 / 2) * amplitude, 'dB': 20 * np.log(amplitude)}
+
+
+def test_dft_reference():
+    import numpy as np
+    from scipy.fft import next_fast_len
+    from my_signal import Motion, my_dft
+    rng = np.random.default_rng(12)
+    for n, n_fft, fast_length in ((1000, None, False), (1001, None, False), (1001, 1500, False),
+                                  (1009, None, True)):
+        time = np.arange(n) * 0.005
+        motion = rng.standard_normal((n, 3))
+        length = n_fft or (next_fast_len(n, real=True) if fast_length else n)
+        results = (my_dft(time, motion, n_fft=n_fft, fast_length=fast_length),
+                   Motion(time, motion).dft(n_fft=n_fft, fast_length=fast_length))
+        for result in results:
+            assert result['complex'].shape == (length // 2 + 1, 3)
+            for k in range(3):
+                expected = _dft_reference(time, motion[:, k], length)
+                assert np.allclose(result['frequency'], expected.pop('frequency'), rtol=1e-12)
+                for name, value in expected.items():
+                    assert np.allclose(result[name][:, k], value, rtol=1e-10, atol=1e-12), (n, n_fft, name)
+    # one channel stays 1-D
+    assert my_dft(time, motion[:, 0])['amplitude'].shape == (n // 2 + 1,)
+
+
+def test_rpt_chunk_reader(tmp_path):
+    import numpy as np
+    from my_benchmark import synthetic_motion, write_rpt
+    from my_rpt import rpt_chunk_reader, rpt_reader
+    write_rpt(str(tmp_path / 'run.rpt'), *synthetic_motion(1003, 4))
+    whole = rpt_reader(str(tmp_path / 'run.rpt'))
+    for dtype in (float, np.float32):
+        chunks = list(rpt_chunk_reader(str(tmp_path / 'run.rpt'), chunk_size=100, usecols=['ACC2', 1], dtype=dtype))
+        assert [len(chunk.time) for chunk in chunks] == [100] * 10 + [3]
+        assert chunks[0].columns == ['ACC2', 'ACC0']
+        time = np.concatenate([chunk.time for chunk in chunks])
+        data = np.concatenate([chunk.data for chunk in chunks])
+        assert time.dtype == np.float64 and data.dtype == dtype and data.flags.c_contiguous
+        assert np.array_equal(time, whole['X'].to_numpy())
+        assert np.array_equal(data, whole[['ACC2', 'ACC0']].to_numpy().astype(dtype))
+    narrow = rpt_reader(str(tmp_path / 'run.rpt'), dtype=np.float32)
+    assert np.array_equal(data, narrow[['ACC2', 'ACC0']].to_numpy())
+
+
+def test_response_spectrum_rounded_time():
+    import numpy as np
+    from my_response_spectrum import response_spectrum, spectrum_intensity
+    from my_signal import Motion
+    # times written with 3 decimals at 300 Hz: time[1] - time[0] is 0.003 instead of 1 / 300
+    exact = np.arange(3001) / 300
+    rounded = np.round(exact, 3)
+    acc = np.random.default_rng(13).standard_normal((3001, 2))
+    expected = response_spectrum(exact, acc, periods=[0.1, 0.5, 2.])
+    assert np.allclose(Motion(rounded, acc).response_spectrum(periods=[0.1, 0.5, 2.])['Sd'], expected['Sd'],
+                       rtol=1e-9)
+    assert np.allclose(Motion(rounded, acc).VSI(), spectrum_intensity(exact, acc), rtol=1e-9)
+
+
+def test_butter_filter_scipy():
+    import numpy as np
+    from scipy import signal
+    from my_signal import Motion, StreamingFilter, _butter_sos, butter_filter, butter_sos
+    data = np.random.default_rng(14).standard_normal((2000, 3))
+    for btype, cutoff in (('low', 30.), ('high', 2.), ('band', (5., 40.))):
+        sos = signal.butter(4, cutoff, btype=btype, fs=200., output='sos')
+        assert np.allclose(butter_sos(btype, 4, cutoff, 200.), sos, rtol=1e-12, atol=1e-15)
+        assert np.allclose(butter_filter(data, cutoff, 200., btype=btype), signal.sosfiltfilt(sos, data, axis=0),
+                           rtol=1e-10, atol=1e-12)
+        causal = signal.sosfilt(sos, data, axis=0)
+        assert np.allclose(butter_filter(data, cutoff, 200., btype=btype, zero_phase=False), causal,
+                           rtol=1e-10, atol=1e-12)
+        assert np.allclose(butter_filter(data.T, cutoff, 200., btype=btype, zero_phase=False, axis=-1), causal.T,
+                           rtol=1e-10, atol=1e-12)
+        assert np.allclose(StreamingFilter(cutoff, 200., btype=btype).push(data), causal, rtol=1e-10, atol=1e-12)
+    assert butter_filter(data.astype(np.float32), 30., 200.).dtype == np.float32
+    # repeated designs, also through equivalent arguments, are one cached array
+    _butter_sos.cache_clear()
+    sos = butter_sos('lowpass', 4, 30, 200)
+    assert butter_sos('low', 4., 30., 200.) is sos
+    Motion(np.arange(2000) * 0.005, data).filter(cutoff=30.)
+    StreamingFilter(30, 200)
+    assert _butter_sos.cache_info().hits == 3 and _butter_sos.cache_info().misses == 1
+
+
+def test_channel_set(tmp_path):
+    import numpy as np
+    import pandas as pd
+    import pytest
+    from my_channels import ChannelSet
+    from my_output import Export2D, Line
+    from my_signal import Motion
+    time = np.arange(500) * 0.005
+    data = np.random.default_rng(15).standard_normal((500, 4))
+    channels = ChannelSet(time, data, ['a', 'b', 'c', 'd'], ['g'] * 4)
+    # channels, lines and contiguous selections are views of the buffer
+    assert np.shares_memory(channels['b'], data) and np.array_equal(channels['b'], data[:, 1])
+    selected = channels.select(['b', 'c'])
+    assert np.shares_memory(selected.data, data) and selected.names == ['b', 'c'] and selected.x is channels.x
+    assert np.array_equal(channels.select(['d', 0]).data, data[:, [3, 0]])
+    lines = channels.lines()
+    assert all(line.x is channels.x and np.shares_memory(line.y, data) for line in lines)
+    assert [line.y_name for line in lines] == channels.names and lines[2].x_name == 'time'
+    with pytest.raises(ValueError):
+        ChannelSet(time, data, ['a', 'b'])
+    with pytest.raises(ValueError):
+        ChannelSet(time[:-1], data)
+
+    # from_lines and from_dataframe round trips
+    rebuilt = ChannelSet.from_lines(lines)
+    assert np.array_equal(rebuilt.data, data) and rebuilt.names == channels.names and rebuilt.x_name == 'time'
+    with pytest.raises(ValueError):
+        ChannelSet.from_lines([Line(time, data[:, 0]), Line(time + 1., data[:, 1])])
+    frame = pd.DataFrame({'time': time, **{name: data[:, i].astype(np.float32) for i, name in enumerate('abcd')}})
+    rebuilt = ChannelSet.from_dataframe(frame)
+    assert rebuilt.x.dtype == np.float64 and rebuilt.data.dtype == np.float32 and rebuilt.data.flags.c_contiguous
+    assert rebuilt.names == list('abcd') and rebuilt.x_name == 'time'
+    assert np.array_equal(rebuilt.x, time) and np.array_equal(rebuilt.data, data.astype(np.float32))
+
+    # Motion and Export2D take a ChannelSet
+    motion = Motion(channels)
+    assert motion.motion is data and motion.names == channels.names and motion.channel_index('c') == 2
+    export = Export2D(channels)
+    assert [line.y_name for line in export.line_array] == channels.names
+    export = Export2D([channels, channels.select(['a'])])
+    assert [len(item) for item in export.line_array] == [4, 1]
+    export.plot_multiple(is_show=False, fig_save_name=str(tmp_path / 'channels'), fig_save_format=('png',), dpi=50,
+                         fig_col_num=2, x_label=('t', 't'), y_label=('a', 'a'), title=('1', '2'))
+    assert (tmp_path / 'channels.png').exists()
+
+
+def test_profile(tmp_path):
+    import io
+    import json
+    import tracemalloc
+    import numpy as np
+    import my_profile
+
+    @my_profile.profiled('square')
+    def square(data):
+        return data ** 2
+
+    data = np.ones(1000)
+    my_profile.reset()
+    # disabled: nothing is recorded and tracemalloc is not started
+    square(data)
+    with my_profile.profile_block('block') as record:
+        assert record == {}
+    assert my_profile.records() == [] and not tracemalloc.is_tracing()
+    try:
+        my_profile.enable()
+        assert not tracemalloc.is_tracing()
+        square(data)
+        record, = my_profile.records()
+        assert set(record) == {'name', 'start', 'wall', 'cpu', 'peak', 'in_bytes', 'out_bytes', 'pid', 'tid'}
+        assert record['name'] == 'square' and record['in_bytes'] == record['out_bytes'] == 8000
+        assert record['peak'] is None and record['wall'] >= 0 and record['pid'] == os.getpid()
+
+        # the peak of a nested block is part of the peak of the enclosing block
+        my_profile.reset()
+        my_profile.enable(memory=True)
+        with my_profile.profile_block('outer'):
+            with my_profile.profile_block('inner'):
+                buffer = np.ones(1 << 20)
+                del buffer
+            small = np.ones(1 << 10)
+        inner, outer = my_profile.records()
+        assert inner['name'] == 'inner' and inner['peak'] >= 8 << 20
+        assert outer['peak'] >= inner['peak'] and outer['wall'] >= inner['wall']
+        del small
+    finally:
+        my_profile.disable()
+        my_profile.reset()
+    assert not tracemalloc.is_tracing()
+
+    records = [{'name': 'a', 'start': 10., 'wall': 0.5, 'cpu': 0.4, 'peak': 100, 'in_bytes': 1, 'out_bytes': 2,
+                'pid': 1, 'tid': 2},
+               {'name': 'b', 'start': 10.25, 'wall': 3., 'cpu': 1., 'peak': None, 'in_bytes': 0, 'out_bytes': 0,
+                'pid': 1, 'tid': 2},
+               {'name': 'a', 'start': 11., 'wall': 1.5, 'cpu': 1.2, 'peak': 300, 'in_bytes': 3, 'out_bytes': 4,
+                'pid': 1, 'tid': 3}]
+    b, a = my_profile.summarize(records)
+    assert b == {'name': 'b', 'calls': 1, 'wall': 3., 'cpu': 1., 'peak': None, 'in_bytes': 0, 'out_bytes': 0,
+                 'mean': 3.}
+    assert a == {'name': 'a', 'calls': 2, 'wall': 2., 'cpu': 1.6, 'peak': 300, 'in_bytes': 4, 'out_bytes': 6,
+                 'mean': 1.}
+    table = io.StringIO()
+    my_profile.summary(records, file=table)
+    assert [line.split()[:2] for line in table.getvalue().splitlines()[1:]] == [['b', '1'], ['a', '2']]
+
+    my_profile.dump_chrome_trace(str(tmp_path / 'trace.json'), records)
+    with open(tmp_path / 'trace.json') as f:
+        trace = json.load(f)
+    events = trace['traceEvents']
+    # microseconds from the first record
+    assert [event['ts'] for event in events] == [0., 250000., 1000000.]
+    assert [event['dur'] for event in events] == [500000., 3000000., 1500000.]
+    assert all(event['ph'] == 'X' and event['pid'] == 1 for event in events) and events[2]['tid'] == 3
+    assert events[0]['args'] == {'cpu': 0.4, 'peak': 100, 'in_bytes': 1, 'out_bytes': 2}
+
+
+def test_profile_motion_dft():
+    import numpy as np
+    import my_profile
+    from my_signal import Motion
+    record = Motion(np.arange(1000) * 0.005, np.random.default_rng(16).standard_normal((1000, 2)))
+    my_profile.reset()
+    my_profile.enable()
+    try:
+        record.dft(('amplitude',))
+        # a cache hit computes nothing and is not recorded
+        record.dft(('amplitude',))
+        names = [row['name'] for row in my_profile.records()]
+    finally:
+        my_profile.disable()
+        my_profile.reset()
+    assert names == ['my_signal.Spectrum.transform']
+
+
+def test_transfer_function_suite_rounded_time():
+    import numpy as np
+    from my_signal import Motion
+    from my_spectral import transfer_function_suite
+    # times written with 3 decimals at 300 Hz, the suite and the Motion method use the same averaged fs
+    time = np.round(np.arange(6001) / 300, 3)
+    motion = np.random.default_rng(17).standard_normal((6001, 3))
+    record = Motion(time, motion)
+    for estimator in ('welch', 'dft'):
+        expected = record.transfer_function(estimator=estimator, nperseg=512)
+        result, = transfer_function_suite([record], max_workers=0, estimator=estimator, nperseg=512)
+        assert np.array_equal(result['frequency'], expected['frequency'])
+        assert np.allclose(result['H1'], expected['H1'], rtol=1e-12)
+        assert np.allclose(result['coherence'], expected['coherence'], rtol=1e-12, equal_nan=True)
+
+
+def test_downsample_grid():
+    import numpy as np
+    import pytest
+    from my_output import Curve, downsample_grid
+    x = np.arange(103) * 0.5
+    y = np.arange(10) * 2.
+    z = np.random.default_rng(18).standard_normal((10, 103))
+    z[3, 50] = 100.
+    with pytest.raises(ValueError):
+        Curve(x, y, z.T)
+    # blocks of 3 rows and 11 columns, the last blocks are shorter
+    xd, yd, zd = downsample_grid(x, y, z, (4, 10))
+    assert zd.shape == (4, 10) and len(xd) == 10 and len(yd) == 4
+    row_blocks = [slice(i, i + 3) for i in range(0, 10, 3)]
+    column_blocks = [slice(j, j + 11) for j in range(0, 103, 11)]
+    assert np.array_equal(zd, [[z[r, c].max() for c in column_blocks] for r in row_blocks])
+    assert np.allclose(xd, [x[c].mean() for c in column_blocks]) and np.allclose(yd, [y[r].mean() for r in row_blocks])
+    assert zd.max() == 100.
+    _, _, zm = downsample_grid(x, y, z, (4, 10), reduce='mean')
+    assert np.allclose(zm, [[z[r, c].mean() for c in column_blocks] for r in row_blocks])
+    # a grid within max_shape is returned as it is, nan does not hide the block maximum
+    xd, yd, zd = downsample_grid(x, y, z, (10, 200))
+    assert xd is x and yd is y and zd is z
+    z[0, 0] = np.nan
+    assert downsample_grid(x, y, z, (1, 1))[2][0, 0] == 100.
+    for max_shape in ((1, 1), (7, 13), (0, 50)):
+        assert all(n <= max(m, 1) for n, m in zip(downsample_grid(x, y, z, max_shape)[2].shape, max_shape))
+    with pytest.raises(ValueError):
+        downsample_grid(x, y, z, (4, 10), reduce='median')
+
+
+def test_export3d(tmp_path):
+    import numpy as np
+    from matplotlib import cm
+    from my_output import Curve, Export3D
+    from my_signal import Motion, plot_3d
+    frequency = np.linspace(0., 50., 2001)
+    runs = np.arange(6.)
+    amplitude = np.abs(np.random.default_rng(19).standard_normal((6, 2001))) + 1e-3
+    export = Export3D(Curve(frequency, runs, amplitude, 'Frequency', 'Run', 'Amplitude'))
+    options = dict(is_show=False, fig_save_format=('svg', 'png'), dpi=40)
+    export.plot_heatmap(fig_save_name=str(tmp_path / 'heatmap'), log_scale=True, color_map=cm.magma, **options)
+    export.plot_waterfall(fig_save_name=str(tmp_path / 'waterfall'), color_map=cm.Set2, **options)
+    export.plot_waterfall(fig_save_name=str(tmp_path / 'offset'), offset=1., color_map='viridis', xlim=(5, 20),
+                          **options)
+    export.plot_surface(fig_save_name=str(tmp_path / 'surface'), color_map=cm.coolwarm, max_shape=(6, 50),
+                        **options)
+    # non-uniform rows go through pcolormesh
+    Export3D(Curve(frequency, runs ** 2, amplitude)).plot_heatmap(fig_save_name=str(tmp_path / 'mesh'), **options)
+    plot_3d(frequency[:200], runs, amplitude[:, :200], fig_save_name=str(tmp_path / 'plot_3d'), is_show=False)
+    for name in ('heatmap', 'waterfall', 'offset', 'surface', 'mesh', 'plot_3d'):
+        assert (tmp_path / f'{name}.png').stat().st_size > 0 and (tmp_path / f'{name}.svg').stat().st_size > 0
+    # Motion.plot_3d shows the figure, under the Agg backend show returns at once
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    Motion.plot_3d(frequency[:200], runs, amplitude[:, :200])
+    assert plt.get_fignums()
+    plt.close('all')